@@ -0,0 +1,19 @@
+"""
+Constantes de catégories partagées par l'agent, le moteur ML et le module des likes (sans dépendance lourde).
+"""
+from types import MappingProxyType
+
+# Ordre fixe des colonnes de préférences: vecteur NewAgent.preference_vector et matrice du KNN
+FEATURE_COLS = ("Music", "Sport", "Cinema", "Art", "Nature")
+
+# Catégorie détectée par le LLM -> clé ML (préférences utilisateur et catégorie des likes)
+DETECT_TO_ML = MappingProxyType({
+    'music': 'Music',
+    'party': 'Music',
+    'sport': 'Sport',
+    'cinema': 'Cinema',
+    'theatre': 'Cinema',
+    'art': 'Art',
+    'nature': 'Nature',
+    'family': 'Nature',
+})
@@ -0,0 +1,18 @@
+"""
+Utilitaires de texte purs (sans dépendance) utilisés pour préparer les prompts de l'agent.
+"""
+
+
+def truncate_at_event(text: str, max_chars: int) -> str:
+    """
+    Tronque le texte à max_chars en coupant sur la dernière ligne vide (pas d'événement à moitié).
+    Si cette coupe garde moins de la moitié du budget (ex: intro + événements d'une ligne chacun),
+    on coupe sur la dernière fin de ligne, et en dernier recours à max_chars.
+    """
+    if len(text) <= max_chars:
+        return text
+    min_cut = max_chars // 2
+    cut = text.rfind('\n\n', 0, max_chars)
+    if cut < min_cut:
+        cut = text.rfind('\n', 0, max_chars)
+    return text[:cut] if cut >= min_cut else text[:max_chars]
@@ -2,6 +2,13 @@
 Like Handler Module
 Handles the like/unlike logic for events with ML category detection.
 """
+import logging
+
+# Même table que l'agent: catégorie LLM -> catégorie du vecteur utilisateur
+from categories import DETECT_TO_ML
+
+logger = logging.getLogger(__name__)
+
 
 def handle_like(data, user_profile, agent=None, rec_engine=None):
     """
@@ -16,11 +23,7 @@ def handle_like(data, user_profile, agent=None, rec_engine=None):
     Returns:
         Dict with status and updated data
     """
-    print("=" * 50)
-    print("[LIKE HANDLER] Called!")
-    print("=" * 50)
-    
-    print(f"[DEBUG LIKE] Received data: {data}")
+    logger.debug("[LIKE] Received data: %s", data)
     
     # Extract data
     raw_text = data.get('text')
@@ -28,51 +31,44 @@ def handle_like(data, user_profile, agent=None, rec_engine=None):
     category_forced = data.get('category', None)
     action = data.get('action', 'like')
     
-    print(f"[DEBUG LIKE] text={text[:50] if text else 'None'}...")
-    print(f"[DEBUG LIKE] category_forced={category_forced}")
-    print(f"[DEBUG LIKE] action={action}")
-    print(f"[DEBUG LIKE] user_profile vector keys: {list(user_profile['vector'].keys())}")
+    logger.debug("[LIKE] text=%s...", text[:50] if text else None)
+    logger.debug("[LIKE] category_forced=%s", category_forced)
+    logger.debug("[LIKE] action=%s", action)
+    logger.debug("[LIKE] user_profile vector keys: %s", list(user_profile['vector']))
     
     cat_found = None
     
     # --- 1. PRIORITIZE FRONTEND CATEGORY (GREEN: No API call needed!) ---
     if category_forced:
-        print(f"[DEBUG LIKE] Checking category_forced: '{category_forced}'")
+        logger.debug("[LIKE] Checking category_forced: '%s'", category_forced)
         # Try exact match first
         if category_forced in user_profile["vector"]:
             cat_found = category_forced
-            print(f"✅ Using frontend category directly: {cat_found}")
+            logger.debug("[LIKE] Using frontend category directly: %s", cat_found)
         else:
             # Case-insensitive fallback
             for key in user_profile["vector"]:
                 if key.lower() == category_forced.lower():
                     cat_found = key
-                    print(f"✅ Using frontend category (case-matched): {cat_found}")
+                    logger.debug("[LIKE] Using frontend category (case-matched): %s", cat_found)
                     break
     
     # --- 2. FALLBACK: LLM Classification (only if category not provided) ---
     if not cat_found and text and agent and hasattr(agent, '_detect_category_with_llm'):
-        print(f"🌱 Using LLM to classify: '{text[:50]}...'")
+        logger.debug("[LIKE] Using LLM to classify: '%s...'", text[:50])
         llm_cat = agent._detect_category_with_llm(text)
-        category_mapping = {
-            'music': 'Music', 'party': 'Music',
-            'sport': 'Sport',
-            'cinema': 'Cinema', 'theatre': 'Cinema',
-            'art': 'Art',
-            'nature': 'Nature', 'family': 'Nature',
-        }
-        cat_found = category_mapping.get(llm_cat, None)
-        print(f"✅ LLM classified as: {cat_found}")
+        cat_found = DETECT_TO_ML.get(llm_cat, None)
+        logger.debug("[LIKE] LLM classified as: %s", cat_found)
     
     # --- 3. FALLBACK: TF-IDF Green Classifier ---
     if not cat_found and text and rec_engine and hasattr(rec_engine, 'classify_text_green'):
-        print(f"🌱 Fallback to Green Classifier: '{text[:50]}...'")
+        logger.debug("[LIKE] Fallback to Green Classifier: '%s...'", text[:50])
         cat_found = rec_engine.classify_text_green(text)
-        print(f"✅ Green Classifier found: {cat_found}")
+        logger.debug("[LIKE] Green Classifier found: %s", cat_found)
     
     # --- 4. No category found ---
     if not cat_found:
-        print("⚠️ Aucune catégorie détectée pour ce Like.")
+        logger.warning("[LIKE] Aucune catégorie détectée pour ce Like.")
         return {
             "status": "ignored", 
             "message": "Catégorie indéterminée",
@@ -80,7 +76,7 @@ def handle_like(data, user_profile, agent=None, rec_engine=None):
         }
     
     # --- 5. Update user vector ---
-    print(f"[DEBUG LIKE] cat_found = {cat_found}, updating vector...")
+    logger.debug("[LIKE] cat_found = %s, updating vector...", cat_found)
     
     if action == 'like':
         user_profile["vector"][cat_found] = min(1.0, user_profile["vector"][cat_found] + 0.25)
@@ -97,7 +93,7 @@ def handle_like(data, user_profile, agent=None, rec_engine=None):
             if category != cat_found:
                 user_profile["vector"][category] = min(1.0, user_profile["vector"][category] + 0.05)
     
-    print(f"[DEBUG LIKE] Updated vector: {user_profile['vector']}")
+    logger.debug("[LIKE] Updated vector: %s", user_profile['vector'])
     
     # Update agent's internal preferences
     if agent and hasattr(agent, 'like_event'):
@@ -109,9 +105,9 @@ def handle_like(data, user_profile, agent=None, rec_engine=None):
         try:
             new_neighbor = rec_engine.find_similar_user(user_profile["vector"])
             user_profile["neighbor"] = new_neighbor
-            print(f"[DEBUG LIKE] New neighbor: {new_neighbor}")
+            logger.debug("[LIKE] New neighbor: %s", new_neighbor)
         except Exception as e:
-            print(f"Error finding neighbor: {e}")
+            logger.warning("[LIKE] Error finding neighbor: %s", e)
     
     response_data = {
         "status": "success",
@@ -121,5 +117,5 @@ def handle_like(data, user_profile, agent=None, rec_engine=None):
         "new_vector": user_profile["vector"],
         "new_neighbor": new_neighbor
     }
-    print(f"[DEBUG LIKE] Returning: {response_data}")
+    logger.debug("[LIKE] Returning: %s", response_data)
     return response_data
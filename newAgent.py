@@ -1,16 +1,208 @@
 import os
 import re
+import time
+import hashlib
+import functools
 import random
-from typing import List, Dict, Optional, Tuple
+import logging
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+import numpy as np
+from types import MappingProxyType
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator
 from langchain.agents import AgentType, initialize_agent, Tool
 from langchain_mistralai import ChatMistralAI
-from langchain.memory import ConversationBufferMemory
-from langchain.schema import SystemMessage
+from langchain.memory import ConversationBufferWindowMemory
 
-from toolsFolder.eventBriteTool import get_eventBrite_events_for_llm, fetch_events_to_cache
+from toolsFolder.eventBriteTool import get_eventBrite_events_for_llm, fetch_events_to_cache, get_embedding
 from toolsFolder.eventBrusselsTool import get_brussels_events_for_llm
 from toolsFolder.ticketMasterTool import get_ticketmaster_events_for_llm
 from toolsFolder.eventCache import event_cache  # Import global cache
+from categories import DETECT_TO_ML, FEATURE_COLS
+from formatting import truncate_at_event
+
+logger = logging.getLogger(__name__)
+
+# Préfixes reconnus par le parser HTML (str.startswith accepte un tuple)
+_SECTION_PREFIXES = ('🎯', '📌', '🌟', '🤖', '🎲', '❌', '📭', '💬', '🔄', '🎬', '🎵', '🎨', '🏃', '🌳', '🍳', '🆓', '🎫', '🎭', '🌐', '💡')
+_DETAIL_PREFIXES = ('📅', '📍', '💰', '🆓')
+
+# Gras markdown -> <strong> en une seule passe
+_BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+# Nettoyage du titre pour l'attribut data-event-title
+_TAG_RE = re.compile(r'<[^>]+>')
+_QUOTE_TABLE = str.maketrans({'"': "'"})
+# Instructions des outils qui peuvent fuiter dans la réponse de l'agent
+_LEAKED_IMPORTANT_RE = re.compile(r'⚠️ IMPORTANT:.*?virgules\)', re.DOTALL)
+_LEAKED_DETAILS_RE = re.compile(r'✅ Voici les détails.*?informations\.', re.DOTALL)
+_SOURCE_TAG_RE = re.compile(r'\[Source: \w+\]')
+# Coupure des éléments collés par le LLM sur une même ligne (titre numéroté, emojis de détail, description),
+# appliquée ligne par ligne pendant le parcours
+_LINE_RE = re.compile(r'[^\n]+')
+_INLINE_SPLIT_RE = re.compile(r'\s+(?=\d+\.\s+\*\*|📅|📍|💰|🔗|Description:)')
+_EVENT_HEADER_RE = re.compile(r'^(\d+)\.\s+\*\*(.+?)\*\*')
+_EVENT_HEADER_FALLBACK_RE = re.compile(r'^(\d+)\.\s+([A-Z].+)')
+_NUM_PREFIX_RE = re.compile(r'^\d+\.\s+')
+_URL_RE = re.compile(r'(https?://[^\s\)]+)')
+
+_PROFILE_TAG_RE = re.compile(r"\[PROFILE:([^\]]+)\]\s*(.*)", re.IGNORECASE)
+_EVENT_ID_RE = re.compile(r'\[([a-f0-9]{12})\]')
+_LOCATION_RE = re.compile(r'📍\s*\S+')
+_FORMAT_MARKER_RE = re.compile(r'📅|📍|🔗|Description:')
+
+# Catégorie utilisateur -> (catégorie Brussels API, catégorie TicketMaster/EventBrite)
+_FETCH_MAPPING = MappingProxyType({
+    "music": ("concert", "Music"),
+    "sport": ("sport", "Sports"),
+    "art": ("exhibition", "Arts"),
+    "culture": ("exhibition", "Arts"),
+    "theatre": ("theatre", "Theatre"),
+    "cinema": ("cinema", "Film"),
+    "family": ("various", "Family"),
+    "festival": ("festival", "Music"),
+    "party": ("clubbing", "Music"),
+    "nature": ("various", "Family"),
+})
+
+# Format final d'un événement (PRE-FORMATTED, prêt pour l'affichage)
+_EVENT_DETAILS_TEMPLATE = (
+    "{idx}. **{name}**\n"
+    "📅 {date}\n"
+    "📍 {location}\n"
+    "💰 {price}\n"
+    "🔗 {url}\n"
+    "Description: {description}"
+)
+
+# Cache des recherches par catégorie: cat_lower -> (timestamp, résultat de fetch_all_events_minimal)
+_EVENTS_CACHE_TTL = 300  # 5 minutes
+_events_cache: Dict[str, Tuple[float, str]] = {}
+_events_lock = threading.Lock()
+# Single-flight: une seule récupération en cours par catégorie, les appels concurrents l'attendent
+_events_inflight: Dict[str, threading.Event] = {}
+
+# Les trois sources sont indépendantes: on les interroge en parallèle (pool réutilisé entre les appels).
+# 6 workers: la recherche de l'agent et celle de la nouveauté (catégorie opposée) tournent en même temps
+_EVENT_POOL = ThreadPoolExecutor(max_workers=6, thread_name_prefix="event-fetch")
+_EVENT_FETCH_TIMEOUT = 15  # secondes
+
+# Cache de session des réponses de l'agent: une requête très proche (cosinus) de même catégorie
+# réutilise la réponse précédente au lieu de relancer agent.run
+_SESSION_CACHE_SIZE = 8
+_SESSION_CACHE_SIMILARITY = 0.95
+
+# Historique de conversation: 6 derniers échanges, et au plus ~2k tokens (les listes d'événements sont longues)
+_MEMORY_WINDOW = 6
+_MEMORY_MAX_CHARS = 8000
+
+# Délai max (secondes) pour chacune des sections ML ajoutées après la réponse de l'agent
+_POST_PROCESS_TIMEOUT = 30
+
+# Cache des sections 'Osez la nouveauté': (profil, catégorie, empreinte des événements) -> (timestamp, section)
+_NOVELTY_CACHE_TTL = 900  # 15 minutes
+_NOVELTY_CACHE_SIZE = 64
+
+# Taille max du texte envoyé au LLM de reformatage / de suggestion ML (les tokens d'entrée dominent la latence)
+_REFORMAT_MAX_CHARS = 2500
+_ML_RESULTS_MAX_CHARS = 3000
+
+# Le premier événement d'une liste apparaît toujours en tête de réponse
+_RESULTS_SCAN_CHARS = 4096
+
+# Plafonds de tokens générés: un événement (suggestion ML, nouveauté) / jusqu'à 5 (reformatage)
+_FAST_LLM_MAX_TOKENS = 400
+_REFORMAT_MAX_TOKENS = 1200
+
+# Prompt de classification: partie fixe, le texte à classifier est ajouté à la fin
+_CATEGORY_PROMPT_PREFIX = """Classifie le texte ci-dessous dans UNE SEULE catégorie.
+
+Catégories disponibles:
+- music (concerts, festivals, DJ, orchestres, chorales)
+- sport (match, yoga, fitness, randonnée, sport)
+- cinema (films, projections, cinéma, documentaires)
+- theatre (spectacles, théâtre, pièces)
+- art (exposition, musée, galerie, peinture, sculpture)
+- nature (parc, balade, jardin, forêt, nature)
+- general (autre)
+
+Réponds UNIQUEMENT avec LE MOT DE LA CATÉGORIE (pas d'explication).
+
+"""
+
+# Mots-clés des profils, par ordre de priorité (le premier profil trouvé dans le message l'emporte)
+_PROFILE_KEYWORDS = (
+    ("Fêtard", ('fête', 'soirée', 'boite', 'party', 'danse', 'club', 'sortir')),
+    ("Culturel", ('musée', 'expo', 'art', 'théâtre', 'spectacle', 'galerie')),
+    ("Sportif", ('sport', 'match', 'courir', 'vélo', 'fitness', 'athlét')),
+    ("Cinéphile", ('film', 'ciné', 'cinéma', 'projection')),
+    ("Chill", ('parc', 'balade', 'calme', 'nature', 'détente', 'promenade')),
+)
+# Lookahead: chaque position est testée, même à l'intérieur d'un mot-clé déjà trouvé (ex: 'art' dans 'party')
+_PROFILE_RE = re.compile('(?=' + '|'.join(
+    f"(?P<p{rank}>{'|'.join(map(re.escape, keywords))})"
+    for rank, (_, keywords) in enumerate(_PROFILE_KEYWORDS)
+) + ')')
+
+# Mots-clés d'une demande d'activités (sinon: question casual), testés en une seule passe regex
+_ACTIVITY_KEYWORDS = (
+    'activ', 'événe', 'sortie', 'cherch', 'veux', 'propos', 'trouv',
+    'ciné', 'cinema', 'cinéma', 'sport', 'musi', 'musique', 'concert', 'expo', 'théâtre', 'theatre',
+    'faire', 'voir', 'cuisine', 'nature', 'gratuit', 'film', 'art', 'show', 'spectacle',
+    'match', 'galerie', 'musée', 'atelier', 'cours', 'balade', 'parc',
+    'aller', 'jouer', 'danser', 'chanter', 'courir', 'marcher', 'randonn'
+)
+_ACTIVITY_RE = re.compile('|'.join(map(re.escape, _ACTIVITY_KEYWORDS)))
+
+# Catégories que le classifieur LLM peut renvoyer (testées dans cet ordre dans sa réponse)
+_VALID_CATEGORIES = ('music', 'sport', 'cinema', 'theatre', 'art', 'nature', 'general')
+
+# Profil -> catégories "opposées" pour la section 'Osez la nouveauté'
+_NOVELTY_OPPOSITES = MappingProxyType({
+    "Fêtard": ("nature", "art"),
+    "Sportif": ("art", "theatre"),
+    "Culturel": ("sport", "party"),
+    "Cinéphile": ("sport", "nature"),
+    "Chill": ("party", "sport"),
+    "Curieux": ("art", "sport"),
+})
+
+# Nombre max de textes dont la catégorie LLM est gardée en mémoire (le plus ancien est retiré)
+_CATEGORY_CACHE_SIZE = 512
+
+# Position de chaque catégorie dans le vecteur de préférences (même ordre que SocialRecommender)
+_PREF_INDEX = MappingProxyType({name: i for i, name in enumerate(FEATURE_COLS)})
+
+
+@functools.lru_cache(maxsize=4096)
+def _profile_from_text(lowered: str) -> str:
+    """Profil du message (déjà en minuscules); mémoïsé, les messages répétés ne refont pas le scan."""
+    # Un seul passage regex; à chaque position le profil prioritaire l'emporte,
+    # puis on garde le profil de plus haute priorité trouvé dans tout le message
+    best = None
+    for match in _PROFILE_RE.finditer(lowered):
+        rank = int(match.lastgroup[1:])
+        if best is None or rank < best:
+            best = rank
+            if rank == 0:
+                break
+    return _PROFILE_KEYWORDS[best][0] if best is not None else "Curieux"
+
+
+def _has_event_results(text: str) -> bool:
+    """Vrai si la réponse contient des événements (date et lieu), en ne regardant que le début du texte."""
+    return text.find('📅', 0, _RESULTS_SCAN_CHARS) != -1 and text.find('📍', 0, _RESULTS_SCAN_CHARS) != -1
+
+
+def _safe_call(name: str, fn, **kwargs) -> Tuple[str, bool]:
+    """Appelle une source d'événements et renvoie (texte, succès) sans lever d'exception."""
+    try:
+        logger.debug("Calling %s with %s", name, kwargs)
+        return fn(**kwargs), True
+    except Exception as e:
+        logger.warning("%s error: %s", name, e)
+        return f"--- {name} ERROR ---\n{str(e)}", False
 
 
 def fetch_all_events_minimal(category: str) -> str:
@@ -21,22 +213,9 @@ def fetch_all_events_minimal(category: str) -> str:
     Input category: music, sport, art, culture, theatre, cinema, family, festival, party, nature
     """
     
-    mapping = {
-        "music": ("concert", "Music"),
-        "sport": ("sport", "Sports"),
-        "art": ("exhibition", "Arts"),
-        "culture": ("exhibition", "Arts"),
-        "theatre": ("theatre", "Theatre"),
-        "cinema": ("cinema", "Film"),
-        "family": ("various", "Family"),
-        "festival": ("festival", "Music"), 
-        "party": ("clubbing", "Music"),
-        "nature": ("various", "Family"),
-    }
-    
     cat_lower = category.lower().strip()
     
-    if cat_lower not in mapping:
+    if cat_lower not in _FETCH_MAPPING:
         return (
             f"CATEGORY_ERROR: La catégorie '{category}' n'est pas reconnue.\n\n"
             f"📋 **Catégories valides :**\n"
@@ -53,48 +232,127 @@ def fetch_all_events_minimal(category: str) -> str:
             f"💡 **Sois plus explicite !** Utilise l'un de ces termes dans ta recherche."
         )
     
-    categoryBru, categoryTM = mapping[cat_lower]
-    results = []
+    with _events_lock:
+        cached = _get_cached_events(cat_lower)
+        inflight = _events_inflight.get(cat_lower)
+        if cached is None and inflight is None:
+            _events_inflight[cat_lower] = threading.Event()
+    if cached is not None:
+        return cached
+    
+    if inflight is not None:
+        # Une autre requête récupère déjà cette catégorie: on attend son résultat
+        inflight.wait(timeout=_EVENT_FETCH_TIMEOUT)
+        with _events_lock:
+            cached = _get_cached_events(cat_lower)
+        if cached is not None:
+            return cached
+        # Récupération en échec (non mise en cache): on interroge les sources nous-mêmes
+        output, _ = _fetch_events_uncached(cat_lower)
+        return output
     
-    # EventBrite
     try:
-        print(f"DEBUG: Calling EventBrite with '{categoryTM}'")
-        eb_res = get_eventBrite_events_for_llm(category_filter=categoryTM)
-        results.append(eb_res)
-    except Exception as e:
-        print(f"DEBUG: EventBrite error: {e}")
-        results.append(f"--- EVENTBRITE ERROR ---\n{str(e)}")
+        output, has_error = _fetch_events_uncached(cat_lower)
+        # On ne garde pas en cache une recherche où une source a échoué
+        if not has_error:
+            with _events_lock:
+                _events_cache[cat_lower] = (time.monotonic(), output)
+    finally:
+        with _events_lock:
+            _events_inflight.pop(cat_lower).set()
+    return output
+
+
+def _get_cached_events(cat_lower: str) -> Optional[str]:
+    """Résultat en cache encore valide pour cette catégorie (appeler sous _events_lock)."""
+    cached = _events_cache.get(cat_lower)
+    if cached and time.monotonic() - cached[0] < _EVENTS_CACHE_TTL:
+        logger.debug("Using cached events for '%s'", cat_lower)
+        return cached[1]
+    return None
 
-    # Brussels
-    try:
-        print(f"DEBUG: Calling Brussels with '{categoryBru}'")
-        bru_res = get_brussels_events_for_llm(category=categoryBru)
-        results.append(bru_res)
-    except Exception as e:
-        print(f"DEBUG: Brussels error: {e}")
-        results.append(f"--- BRUSSELS API ERROR ---\n{str(e)}")
 
-    # TicketMaster
+def _fetch_events_uncached(cat_lower: str) -> Tuple[str, bool]:
+    """Interroge les trois sources et renvoie (sortie pour le LLM, au moins une source en erreur)."""
+    categoryBru, categoryTM = _FETCH_MAPPING[cat_lower]
+    jobs = (
+        ("EVENTBRITE", get_eventBrite_events_for_llm, {"category_filter": categoryTM}),
+        ("BRUSSELS API", get_brussels_events_for_llm, {"category": categoryBru}),
+        ("TICKETMASTER", get_ticketmaster_events_for_llm, {"classificationName": categoryTM}),
+    )
+    futures = {_EVENT_POOL.submit(_safe_call, name, fn, **kw): name for name, fn, kw in jobs}
+    by_source: Dict[str, Tuple[str, bool]] = {}
     try:
-        print(f"DEBUG: Calling TicketMaster with '{categoryTM}'")
-        tm_res = get_ticketmaster_events_for_llm(classificationName=categoryTM)
-        results.append(tm_res)
-    except Exception as e:
-        print(f"DEBUG: TicketMaster error: {e}")
-        results.append(f"--- TICKETMASTER ERROR ---\n{str(e)}")
+        for future in as_completed(futures, timeout=_EVENT_FETCH_TIMEOUT):
+            by_source[futures[future]] = future.result()
+    except FuturesTimeoutError:
+        for future, name in futures.items():
+            if name not in by_source:
+                logger.warning("%s timed out after %ss", name, _EVENT_FETCH_TIMEOUT)
+                by_source[name] = (f"--- {name} ERROR ---\nTimeout après {_EVENT_FETCH_TIMEOUT}s", False)
+
+    # Ordre de sortie identique à l'ordre des sources, quel que soit l'ordre d'arrivée
+    results = [by_source[name][0] for name, _, _ in jobs]
+    has_error = not all(by_source[name][1] for name, _, _ in jobs)
     
     combined = "\n\n".join(results)
-    print("FETCHED EVENTS BY LLM:")
-    print(combined)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Fetched events for LLM:\n%s", combined)
     
     # Add instruction to force using the second tool
-    return (
+    output = (
         f"{combined}\n\n"
         f"⚠️ IMPORTANT: Tu as reçu des données MINIMALES (ID, nom, date courte).\n"
         f"Tu DOIS maintenant utiliser l'outil 'Get Event Details' avec les IDs des 5 événements choisis "
         f"pour obtenir les informations complètes (lieu, prix, URL, description).\n"
         f"Exemple: Get Event Details avec input 'abc123,def456,ghi789'"
     )
+    return output, has_error
+
+
+def clear_events_cache():
+    """Vide le cache des recherches par catégorie."""
+    with _events_lock:
+        _events_cache.clear()
+
+
+def _format_event_details(idx: int, event: dict) -> str:
+    """Formate un événement du cache au format final (emojis 📅📍💰🔗 + Description)."""
+    get = event.get
+    # Handle date - could be 'date' or 'date_start'
+    date = get('date') or get('date_start') or 'Date inconnue'
+    # Clean up ISO date format if needed
+    if 'T' in str(date):
+        date = str(date).replace('T', ' à ').split('+')[0].split('.')[0]
+    
+    venue = get('venue') or 'Lieu non précisé'
+    address = get('address') or ''
+    
+    price = get('price')
+    if not price or str(price).strip() == '':
+        price = 'Prix non précisé'
+    
+    # Clean description - remove newlines and limit length
+    description = str(get('description') or 'Pas de description disponible').replace('\n', ' ').replace('\r', ' ').strip()
+    if len(description) > 300:
+        description = description[:300] + '...'
+    
+    url = get('url') or ''
+    # Validate URL
+    if url and not str(url).startswith('http'):
+        url = 'https://' + str(url)
+    if not url or str(url).strip() == '':
+        url = 'Lien non disponible'
+    
+    return _EVENT_DETAILS_TEMPLATE.format(
+        idx=idx,
+        name=get('name', 'Unknown'),
+        date=date,
+        location=f"{venue} - {address}" if address.strip() else venue,
+        price=price,
+        url=url,
+        description=description,
+    )
 
 
 def get_event_details_by_ids(event_ids: str) -> str:
@@ -104,56 +362,14 @@ def get_event_details_by_ids(event_ids: str) -> str:
     """
     ids = [eid.strip() for eid in event_ids.split(',') if eid.strip()]
 
-    results = []
-    for idx, event_id in enumerate(ids, 1):
-        event = event_cache.get_event(event_id)
-        if event:
-            name = event.get('name', 'Unknown')
-            
-            # Handle date - could be 'date' or 'date_start'
-            date = event.get('date') or event.get('date_start') or 'Date inconnue'
-            # Clean up ISO date format if needed
-            if date and 'T' in str(date):
-                date = str(date).replace('T', ' à ').split('+')[0].split('.')[0]
-            
-            venue = event.get('venue') or 'Lieu non précisé'
-            address = event.get('address') or ''
-            location = f"{venue} - {address}" if address and address.strip() else venue
-            
-            price = event.get('price') or 'Prix non précisé'
-            if not price or str(price).strip() == '':
-                price = 'Prix non précisé'
-            
-            description = event.get('description') or 'Pas de description disponible'
-            # Clean description - remove newlines and limit length
-            description = str(description).replace('\n', ' ').replace('\r', ' ').strip()
-            if len(description) > 300:
-                description = description[:300] + '...'
-            
-            url = event.get('url') or ''
-            # Validate URL
-            if url and not str(url).startswith('http'):
-                url = 'https://' + str(url) if url else ''
-            if not url or str(url).strip() == '':
-                url = 'Lien non disponible'
-            
-            source = event.get('_source', 'unknown').upper()
-            
-            # PRE-FORMATTED output with emojis - ready for final display
-            results.append(
-                f"{idx}. **{name}**\n"
-                f"📅 {date}\n"
-                f"📍 {location}\n"
-                f"💰 {price}\n"
-                f"🔗 {url}\n"
-                f"Description: {description}"
-            )
-        else:
-            results.append(f"{idx}. **Événement non trouvé** (ID: {event_id})")
+    results = [
+        _format_event_details(idx, event) if event else f"{idx}. **Événement non trouvé** (ID: {event_id})"
+        for idx, (event_id, event) in enumerate(zip(ids, event_cache.get_events_batch(ids)), 1)
+    ]
 
     output = "\n\n".join(results) if results else "Aucun événement trouvé."
-    print("FETCHED EVENT DETAILS BY IDS:")
-    print(output)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Fetched event details by ids:\n%s", output)
     
     # Add instruction for final answer
     return (
@@ -163,30 +379,170 @@ def get_event_details_by_ids(event_ids: str) -> str:
     )
 
 
+# Clients httpx (sync, async) partagés par toutes les instances ChatMistralAI du process
+_shared_http_clients = None
+
+
+def _build_llm(**kwargs) -> ChatMistralAI:
+    """
+    Crée un ChatMistralAI qui réutilise le pool de connexions HTTP (keep-alive, TLS)
+    des instances déjà créées, au lieu d'ouvrir le sien.
+    """
+    global _shared_http_clients
+    llm = ChatMistralAI(
+        model="mistral-small-latest",
+        mistral_api_key=os.getenv("MISTRAL_API_KEY"),
+        **kwargs
+    )
+    # ChatMistralAI recrée toujours ses clients dans son validateur: on les remplace après coup
+    if _shared_http_clients is None:
+        _shared_http_clients = (llm.client, llm.async_client)
+    else:
+        llm.client, llm.async_client = _shared_http_clients
+    return llm
+
+
+class _HtmlStreamFormatter:
+    """
+    Parser HTML incrémental pour les réponses de l'agent.
+    Reçoit le texte par morceaux via feed() et renvoie les blocs HTML terminés
+    (section, titre, liste d'événements) dès qu'ils sont complets.
+    """
+
+    def __init__(self, category_context: str = "General"):
+        self.current_section = []
+        self.in_list = False
+        self.list_items: List[List[str]] = []  # fragments HTML de chaque événement, joints à la fermeture de la liste
+        self.current_hidden_info = []
+        self.current_event_category = category_context.capitalize() if category_context else "General"
+
+    def feed(self, text: str) -> List[str]:
+        """Ajoute un morceau de texte et renvoie les blocs HTML terminés."""
+        cleaned = text.replace('```html', '').replace('```', '')
+        
+        # Remove instruction texts that might have leaked through
+        cleaned = _LEAKED_IMPORTANT_RE.sub('', cleaned)
+        cleaned = _LEAKED_DETAILS_RE.sub('', cleaned)
+        cleaned = _SOURCE_TAG_RE.sub('', cleaned)
+        
+        html_parts = []
+        # Parcours des lignes sans construire la liste complète (les lignes vides n'ont aucun effet)
+        for line_match in _LINE_RE.finditer(cleaned):
+            for line in _INLINE_SPLIT_RE.split(line_match.group()):
+                self._feed_line(line.strip(), html_parts)
+        return html_parts
+
+    def close(self) -> List[str]:
+        """Ferme la liste et la section en cours et renvoie les derniers blocs."""
+        html_parts = []
+        if self.list_items:
+            self._flush_list(html_parts)
+        
+        if self.current_section:
+            html_parts.append(f'<div class="section">{" ".join(self.current_section)}</div>')
+            self.current_section = []
+        return html_parts
+
+    def _close_item(self):
+        """Termine l'événement en cours: infos cachées puis indication de clic."""
+        item = self.list_items[-1]
+        if self.current_hidden_info:
+            item.append(f'<div class="more-info">{"".join(self.current_hidden_info)}</div>')
+            self.current_hidden_info = []
+        item.append('<div class="click-hint">🔽 Cliquez pour voir les détails</div></li>')
+
+    def _flush_list(self, html_parts: List[str]):
+        """Termine la liste d'événements en cours et l'ajoute aux blocs HTML."""
+        self._close_item()
+        html_parts.append('<ul class="event-list">' + ''.join(''.join(item) for item in self.list_items) + '</ul>')
+        self.list_items = []
+        self.in_list = False
+
+    def _feed_line(self, line: str, html_parts: List[str]):
+        if line.startswith(_SECTION_PREFIXES):
+            if self.list_items:
+                self._flush_list(html_parts)
+            
+            if self.current_section:
+                html_parts.append(f'<div class="section">{" ".join(self.current_section)}</div>')
+                self.current_section = []
+            
+            html_parts.append(f'<h2 class="section-title">{line}</h2>')
+            return
+        
+        event_match = _EVENT_HEADER_RE.match(line) or _EVENT_HEADER_FALLBACK_RE.match(line)
+        if event_match:
+            if self.list_items:
+                self._close_item()
+            
+            if not self.in_list:
+                if self.current_section:
+                    html_parts.append(f'<div class="section">{" ".join(self.current_section)}</div>')
+                    self.current_section = []
+            
+            content = _NUM_PREFIX_RE.sub('', line)
+            content = _BOLD_RE.sub(r'<strong>\1</strong>', content, count=1)
+            
+            event_title = _TAG_RE.sub('', content).translate(_QUOTE_TABLE)
+            
+            like_btn = f'<button class="like-btn" data-event-title="{event_title}" data-category="{self.current_event_category}" onclick="toggleLike(event, this)">❤️</button>'
+            
+            self.list_items.append([f'<li class="event-item" onclick="toggleEvent(this)">{like_btn} {content}'])
+            self.in_list = True
+            return
+        
+        if self.in_list:
+            if line.startswith(_DETAIL_PREFIXES):
+                line_clean = line.replace('**', '')
+                self.list_items[-1].append(f'<div class="event-detail">{line_clean}</div>')
+            elif line.startswith('🔗'):
+                url = None
+                if 'http' in line:
+                    found = _URL_RE.search(line)
+                    if found:
+                        url = found.group(1)
+                
+                if url:
+                    self.current_hidden_info.append(f'<div class="event-detail link"><a href="{url}" target="_blank">🔗 Voir le site officiel</a></div>')
+                else:
+                    self.current_hidden_info.append('<div class="event-detail">🔗 Lien non disponible</div>')
+            elif line.startswith('Description:'):
+                desc = line.replace('Description:', '').strip()
+                self.current_hidden_info.append(f'<div class="event-description">📝 {desc}</div>')
+            elif line:
+                self.current_hidden_info.append(f'<div class="event-info">{line}</div>')
+        elif line:
+            self.current_section.append(line)
+
+
 class NewAgent:
     def __init__(self):
-        self.llm = ChatMistralAI(
-            model="mistral-small-latest",
-            temperature=0.3,
-            mistral_api_key=os.getenv("MISTRAL_API_KEY")
-        )
+        self.llm = _build_llm(temperature=0.3)
+        # Reformatage, suggestion ML et nouveauté recopient des événements existants:
+        # pas besoin d'échantillonnage ni de longues réponses
+        self.llm_fast = _build_llm(temperature=0.0, max_tokens=_FAST_LLM_MAX_TOKENS)
 
-        self.memory = ConversationBufferMemory(
+        # Fenêtre glissante: seuls les 6 derniers échanges sont renvoyés à l'agent
+        # (ConversationBufferMemory ignorait k et faisait grossir le prompt à chaque tour)
+        self.memory = ConversationBufferWindowMemory(
             memory_key="chat_history",
             return_messages=True,
-            k=10
+            k=_MEMORY_WINDOW
         )
         
-        # User preferences for ML
-        self.user_preferences = {
-            'Music': 0.0,
-            'Sport': 0.0,
-            'Cinema': 0.0,
-            'Art': 0.0,
-            'Nature': 0.0
-        }
+        # User preferences for ML (vecteur contigu, indexé via _PREF_INDEX)
+        self._prefs = np.zeros(len(FEATURE_COLS), dtype=np.float64)
         self.interaction_count = 0
         
+        # (embedding normalisé, catégorie détectée, réponse brute de l'agent) des dernières recherches
+        self._session_cache = deque(maxlen=_SESSION_CACHE_SIZE)
+        self._novelty_cache: Dict[Tuple[str, str, str], Tuple[float, str]] = {}
+        self._category_cache: Dict[str, str] = {}  # texte normalisé -> catégorie détectée par le LLM
+        # /like classe des textes sans prendre le verrou global de l'agent (tenu pendant tout un chat)
+        self._category_lock = threading.Lock()
+        # Pool persistant pour la suggestion ML et la nouveauté (évite de recréer des threads à chaque message)
+        self._post_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ml-post")
+        
         self.tools = [
             Tool(
                 name="Search_Events",
@@ -243,34 +599,84 @@ class NewAgent:
             agent=AgentType.CHAT_CONVERSATIONAL_REACT_DESCRIPTION,
             memory=self.memory,
             verbose=True,
-            system_message=SystemMessage(content=self.system_prompt),
+            # Le prompt système doit passer par agent_kwargs pour atteindre le prompt de l'agent.
+            # Il reste le premier message, identique d'un appel à l'autre (préfixe réutilisable
+            # côté serveur), l'historique et l'input dynamiques viennent après.
+            agent_kwargs={"system_message": self.system_prompt},
             handle_parsing_errors=True,
             max_iterations=4  # Ensure it has enough iterations for 2 tool calls
         )
 
+    def reset_preferences(self):
+        """Réinitialise la conversation, les préférences ML et le cache des recherches."""
+        self.memory.clear()
+        self._prefs = np.zeros(len(FEATURE_COLS), dtype=np.float64)
+        self.interaction_count = 0
+        self._session_cache.clear()
+        self._novelty_cache.clear()
+        clear_events_cache()
+
+    def _trim_memory(self):
+        """
+        Borne l'historique stocké: la fenêtre de k échanges, puis retire les plus anciens
+        échanges tant que le texte dépasse _MEMORY_MAX_CHARS (le dernier échange est toujours gardé).
+        """
+        messages = self.memory.chat_memory.messages
+        del messages[:-2 * _MEMORY_WINDOW]
+        total = sum(len(m.content) for m in messages)
+        drop = 0
+        while total > _MEMORY_MAX_CHARS and len(messages) - drop > 2:
+            total -= len(messages[drop].content) + len(messages[drop + 1].content)
+            drop += 2
+        del messages[:drop]
+
+    @property
+    def user_preferences(self) -> Dict[str, float]:
+        """Vue dict des préférences ML (compatibilité avec newapp / like_handler)."""
+        return dict(zip(FEATURE_COLS, self._prefs.tolist()))
+
+    @user_preferences.setter
+    def user_preferences(self, preferences: Dict[str, float]):
+        self._prefs = np.fromiter(
+            (preferences.get(name, 0.0) for name in FEATURE_COLS),
+            dtype=np.float64, count=len(FEATURE_COLS)
+        )
+
+    @property
+    def preference_vector(self) -> np.ndarray:
+        """Vecteur de préférences prêt pour le KNN (ordre FEATURE_COLS)."""
+        return self._prefs
+
     def _detect_profile_context(self, user_message: str) -> str:
         """
         Déduit un profil basique basé sur le message pour les suggestions ML.
         Profiles: Fêtard, Culturel, Sportif, Cinéphile, Chill
         """
-        msg = user_message.lower()
-        if any(x in msg for x in ['fête', 'soirée', 'boite', 'party', 'danse', 'club', 'sortir']): 
-            return "Fêtard"
-        if any(x in msg for x in ['musée', 'expo', 'art', 'théâtre', 'spectacle', 'galerie']): 
-            return "Culturel"
-        if any(x in msg for x in ['sport', 'match', 'courir', 'vélo', 'fitness', 'athlét']): 
-            return "Sportif"
-        if any(x in msg for x in ['film', 'ciné', 'cinéma', 'projection']): 
-            return "Cinéphile"
-        if any(x in msg for x in ['parc', 'balade', 'calme', 'nature', 'détente', 'promenade']): 
-            return "Chill"
-        return "Curieux"
+        return _profile_from_text(user_message.lower())
+
+    def _embed(self, text: str) -> np.ndarray:
+        """Embedding normalisé (L2) du message, comparable par simple produit scalaire."""
+        embedding = np.asarray(get_embedding(text), dtype=np.float32)
+        return embedding / (np.linalg.norm(embedding) + 1e-12)
+
+    def _remember_response(self, text: str, embedding: Optional[np.ndarray], category: str, response: str):
+        """Ajoute la réponse au cache de session (embedding calculé ici s'il n'a pas servi à la recherche)."""
+        if embedding is None:
+            embedding = self._embed(text)
+        self._session_cache.append((embedding, category, response))
+
+    def _lookup_session_cache(self, embedding: np.ndarray, category: str) -> Optional[str]:
+        """Renvoie la réponse d'une recherche précédente quasi identique et de même catégorie."""
+        for cached_embedding, cached_category, cached_response in self._session_cache:
+            if cached_category == category and float(np.dot(embedding, cached_embedding)) > _SESSION_CACHE_SIMILARITY:
+                return cached_response
+        return None
 
     def _extract_profile_tag(self, user_message: str) -> Tuple[str, str]:
         """Extrait un tag [PROFILE:XXX] au début du message s'il existe."""
         profile = None
         cleaned = user_message
-        match = re.match(r"\[PROFILE:([^\]]+)\]\s*(.*)", user_message, flags=re.IGNORECASE)
+        match = _PROFILE_TAG_RE.match(user_message)
         if match:
             profile = match.group(1).strip()
             cleaned = match.group(2).strip()
@@ -283,50 +689,42 @@ class NewAgent:
         if not text or len(text) < 3:
             return 'general'
         
-        prompt = f"""Classifie ce texte dans UNE SEULE catégorie:
-Texte: "{text}"
-
-Catégories disponibles:
-- music (concerts, festivals, DJ, orchestres, chorales)
-- sport (match, yoga, fitness, randonnée, sport)
-- cinema (films, projections, cinéma, documentaires)
-- theatre (spectacles, théâtre, pièces)
-- art (exposition, musée, galerie, peinture, sculpture)
-- nature (parc, balade, jardin, forêt, nature)
-- general (autre)
-
-Réponds UNIQUEMENT avec LE MOT DE LA CATÉGORIE (pas d'explication)."""
+        # Même texte déjà classifié (ex: contexte des likes puis correction d'une réponse incomplète)
+        cache_key = text.lower().strip()
+        with self._category_lock:
+            cached = self._category_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Partie statique d'abord, texte utilisateur en dernier: le préfixe reste identique
+        prompt = _CATEGORY_PROMPT_PREFIX + f'Texte: "{text}"'
 
         try:
             response = self.llm.invoke(prompt)
             category = str(response.content).strip().lower() if hasattr(response, 'content') else str(response).strip().lower()
-            for valid_cat in ['music', 'sport', 'cinema', 'theatre', 'art', 'nature', 'general']:
-                if valid_cat in category:
-                    return valid_cat
-            return 'general'
+            detected = next(
+                (valid_cat for valid_cat in _VALID_CATEGORIES if valid_cat in category),
+                'general'
+            )
         except Exception as e:
-            print(f"[DEBUG LLM] Erreur détection catégorie: {e}")
+            logger.warning("[LLM] Erreur détection catégorie: %s", e)
             return 'general'
+        
+        # Les erreurs ne sont pas mises en cache: le prochain appel retentera le LLM
+        with self._category_lock:
+            if len(self._category_cache) >= _CATEGORY_CACHE_SIZE:
+                self._category_cache.pop(next(iter(self._category_cache)))
+            self._category_cache[cache_key] = detected
+        return detected
 
     def _update_user_preferences(self, category: str, weight: float = 0.2):
         """Update user preferences based on their searches/interactions."""
-        category_mapping = {
-            'music': 'Music',
-            'party': 'Music',
-            'sport': 'Sport',
-            'cinema': 'Cinema',
-            'theatre': 'Cinema',
-            'art': 'Art',
-            'nature': 'Nature',
-            'family': 'Nature',
-        }
-        
-        ml_category = category_mapping.get(category.lower())
-        if ml_category and ml_category in self.user_preferences:
-            self.user_preferences[ml_category] = min(1.0, 
-                self.user_preferences[ml_category] * 0.8 + weight)
+        idx = _PREF_INDEX.get(DETECT_TO_ML.get(category.lower()))
+        if idx is not None:
+            self._prefs[idx] = min(1.0, self._prefs[idx] * 0.8 + weight)
             self.interaction_count += 1
-            print(f"[DEBUG ML] Updated preferences: {self.user_preferences}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[ML] Updated preferences: %s", self.user_preferences)
 
     def _generate_ml_suggestion(self, current_results: str, profile: str) -> str:
         """
@@ -334,7 +732,7 @@ Réponds UNIQUEMENT avec LE MOT DE LA CATÉGORIE (pas d'explication)."""
         parmi les résultats actuels trouvés par l'agent.
         """
         if not current_results or len(current_results) < 50:
-            print("[DEBUG ML] Pas assez de résultats pour suggestion ML")
+            logger.debug("[ML] Pas assez de résultats pour suggestion ML")
             return ""
 
         # The results are already formatted, just ask LLM to pick the best one
@@ -342,7 +740,7 @@ Réponds UNIQUEMENT avec LE MOT DE LA CATÉGORIE (pas d'explication)."""
 TÂCHE: Parmi les événements suivants, lequel est LE MEILLEUR pour lui ?
 
 RÉSULTATS:
-{current_results[:3000]}
+{truncate_at_event(current_results, _ML_RESULTS_MAX_CHARS)}
 
 INSTRUCTION: 
 1. Choisis UN SEUL événement de la liste
@@ -361,12 +759,13 @@ FORMAT DE RÉPONSE:
 Description: [Description EXACTE]"""
 
         try:
-            response = self.llm.invoke(prompt)
+            response = self.llm_fast.invoke(prompt)
             suggestion = str(response.content) if hasattr(response, 'content') else str(response)
-            print(f"[DEBUG ML] Suggestion générée: {suggestion[:100]}...")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[ML] Suggestion générée: %s...", suggestion[:100])
             return "\n\n" + suggestion
         except Exception as e:
-            print(f"[DEBUG ML] Erreur suggestion personnalisée: {e}")
+            logger.warning("[ML] Erreur suggestion personnalisée: %s", e)
             return ""
 
     def _generate_novelty(self, profile: str) -> str:
@@ -374,33 +773,32 @@ Description: [Description EXACTE]"""
         Génère la section 'Osez la nouveauté' en cherchant une catégorie opposée
         et en sélectionnant UN vrai événement via LLM.
         """
-        opposites = {
-            "Fêtard": ["nature", "art"],
-            "Sportif": ["art", "theatre"],
-            "Culturel": ["sport", "party"],
-            "Cinéphile": ["sport", "nature"],
-            "Chill": ["party", "sport"],
-            "Curieux": ["art", "sport"]
-        }
-        
-        choices = opposites.get(profile, ["art"])
+        choices = _NOVELTY_OPPOSITES.get(profile, ("art",))
         target_category = random.choice(choices)
         
-        print(f"[DEBUG NOVELTY] Profil: {profile} -> Catégorie opposée: {target_category}")
+        logger.debug("[NOVELTY] Profil: %s -> Catégorie opposée: %s", profile, target_category)
         
         # Get minimal events for the opposite category
         events_minimal = fetch_all_events_minimal(target_category)
         
         if "Aucun événement" in events_minimal or "CATEGORY_ERROR" in events_minimal:
-            print(f"[DEBUG NOVELTY] Aucun événement trouvé pour {target_category}")
+            logger.debug("[NOVELTY] Aucun événement trouvé pour %s", target_category)
             return ""
 
         # Extract IDs from minimal events
-        ids = re.findall(r'\[([a-f0-9]{12})\]', events_minimal)
+        ids = _EVENT_ID_RE.findall(events_minimal)
         if not ids:
-            print(f"[DEBUG NOVELTY] Aucun ID trouvé dans les événements")
+            logger.debug("[NOVELTY] Aucun ID trouvé dans les événements")
             return ""
         
+        # Même profil, même catégorie et mêmes événements: on réutilise la section déjà générée
+        cache_key = (profile, target_category,
+                     hashlib.blake2b(events_minimal[:2000].encode(), digest_size=8).hexdigest())
+        cached = self._novelty_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < _NOVELTY_CACHE_TTL:
+            logger.debug("Using cached novelty for %s/%s", profile, target_category)
+            return cached[1]
+        
         # Pick a random event ID (or first few)
         selected_ids = random.sample(ids, min(3, len(ids)))
         
@@ -428,53 +826,95 @@ FORMAT DE RÉPONSE (recopie EXACTEMENT les infos de l'événement choisi):
 Description: [Description EXACTE]"""
 
         try:
-            format_response = self.llm.invoke(format_prompt)
+            format_response = self.llm_fast.invoke(format_prompt)
             novelty = str(format_response.content) if hasattr(format_response, 'content') else str(format_response)
-            print(f"[DEBUG NOVELTY] Générée: {novelty[:100]}...")
-            return "\n\n" + novelty
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[NOVELTY] Générée: %s...", novelty[:100])
+            section = "\n\n" + novelty
+            if len(self._novelty_cache) >= _NOVELTY_CACHE_SIZE:
+                # Les dict gardent l'ordre d'insertion: on retire l'entrée la plus ancienne
+                self._novelty_cache.pop(next(iter(self._novelty_cache)))
+            self._novelty_cache[cache_key] = (time.monotonic(), section)
+            return section
         except Exception as e:
-            print(f"[DEBUG NOVELTY] Erreur: {e}")
+            logger.warning("[NOVELTY] Erreur: %s", e)
         
         return ""
 
-    def _add_ml_suggestions_to_response(self, response: str, profile: str) -> str:
+    def _iter_ml_suggestions(self, response: str, profile: str,
+                             novelty_future: Optional[Future] = None) -> Iterator[str]:
         """
-        Ajoute les suggestions ML en utilisant des VRAIS événements des APIs.
+        Génère les sections ML une par une (suggestion personnalisée puis nouveauté),
+        pour pouvoir envoyer chacune au client dès qu'elle est prête.
+        novelty_future: génération de la nouveauté déjà lancée (ex: pendant l'exécution de l'agent).
         """
-        enhanced = response
-        
+        # Les deux générations sont indépendantes: on les lance en parallèle sur le pool de l'agent,
+        # puis on les renvoie dans l'ordre d'affichage
         # 1. Suggestion personnalisée (parmi les résultats courants trouvés)
-        if "📅" in response and "📍" in response:
-            ml_suggestion = self._generate_ml_suggestion(response, profile)
-            enhanced += ml_suggestion
+        ml_future = None
+        if _has_event_results(response):
+            ml_future = self._post_pool.submit(self._generate_ml_suggestion, response, profile)
         
         # 2. Osez la Nouveauté (chercher une catégorie opposée)
-        novelty_section = self._generate_novelty(profile)
-        enhanced += novelty_section
+        if novelty_future is None:
+            novelty_future = self._post_pool.submit(self._generate_novelty, profile)
         
-        return enhanced
+        for future in (ml_future, novelty_future):
+            if future is None:
+                continue
+            try:
+                yield future.result(timeout=_POST_PROCESS_TIMEOUT)
+            except FuturesTimeoutError:
+                logger.warning("ML post-processing timed out after %ss", _POST_PROCESS_TIMEOUT)
+
+    def _add_ml_suggestions_to_response(self, response: str, profile: str,
+                                        novelty_future: Optional[Future] = None) -> str:
+        """
+        Ajoute les suggestions ML en utilisant des VRAIS événements des APIs.
+        """
+        return response + ''.join(self._iter_ml_suggestions(response, profile, novelty_future))
+
+    @staticmethod
+    def _already_formatted(text: str) -> bool:
+        """Vrai si la réponse a déjà le format attendu (détails complets): pas besoin d'appel LLM."""
+        # Un seul parcours du texte, arrêté dès que 2 dates, 2 lieux, 2 liens et une description sont vus
+        # (compteurs décalés: un marqueur est satisfait quand il atteint 1)
+        counts = {'📅': -1, '📍': -1, '🔗': -1, 'Description:': 0}
+        missing = len(counts)
+        for match in _FORMAT_MARKER_RE.finditer(text):
+            marker = match.group()
+            counts[marker] += 1
+            if counts[marker] == 1:
+                missing -= 1
+                if not missing:
+                    return True
+        return False
 
     def _force_reformat_with_llm(self, raw_text: str) -> str:
         """Force le reformatage si nécessaire - skip si déjà bien formaté."""
         if not raw_text:
             return raw_text
         
-        # Check if already well formatted with full details
-        has_emojis = raw_text.count('📅') >= 2 and raw_text.count('📍') >= 2 and raw_text.count('🔗') >= 2
-        has_descriptions = 'Description:' in raw_text
-        
-        if has_emojis and has_descriptions:
+        if self._already_formatted(raw_text):
             # Already formatted, just clean up
-            cleaned = re.sub(r'\[Source: \w+\]', '', raw_text)
-            cleaned = re.sub(r'⚠️ IMPORTANT:.*?virgules\)', '', cleaned, flags=re.DOTALL)
-            cleaned = re.sub(r'✅ Voici les détails.*?informations\.', '', cleaned, flags=re.DOTALL)
+            cleaned = _SOURCE_TAG_RE.sub('', raw_text)
+            cleaned = _LEAKED_IMPORTANT_RE.sub('', cleaned)
+            cleaned = _LEAKED_DETAILS_RE.sub('', cleaned)
             return cleaned.strip()
         
         # Not properly formatted - needs reformatting
+        return ''.join(self._iter_reformat_with_llm(raw_text))
+
+    def _iter_reformat_with_llm(self, raw_text: str) -> Iterator[str]:
+        """
+        Reformate via LLM en streaming: renvoie le texte par blocs d'événements complets
+        (coupés sur les lignes vides) au fur et à mesure de la génération.
+        Valeur de retour du générateur: False si le LLM a échoué (texte brut ou partiel envoyé).
+        """
         prompt = f"""Reformate les événements ci-dessous AU FORMAT STRICT. Ne garde que 5 événements max.
 
 Texte à reformater:
-{raw_text[:5000]}
+{truncate_at_event(raw_text, _REFORMAT_MAX_CHARS)}
 
 RÈGLES DE FORMAT (OBLIGATOIRE):
 1. **Titre**
@@ -490,30 +930,87 @@ CONTRAINTES:
 - Garde le texte en français
 - Pas d'explications supplémentaires
 """
+        buffer = ''
+        emitted = False
         try:
-            resp = self.llm.invoke(prompt)
-            return resp.content if hasattr(resp, "content") else str(resp)
+            # Jusqu'à 5 événements complets: plafond de tokens plus large que les autres appels rapides
+            for chunk in self.llm_fast.stream(prompt, max_tokens=_REFORMAT_MAX_TOKENS):
+                buffer += chunk.content
+                cut = buffer.rfind('\n\n')
+                if cut != -1:
+                    yield buffer[:cut + 2]
+                    buffer = buffer[cut + 2:]
+                    emitted = True
         except Exception as e:
-            print(f"[DEBUG] Reformat LLM failed: {e}")
-            return raw_text
+            logger.warning("Reformat LLM failed: %s", e)
+            if not emitted:
+                yield raw_text
+                return False
+            if buffer:
+                yield buffer
+            return False
+        if buffer:
+            yield buffer
+        return True
+
+    def _needs_llm_reformat(self, raw_text: str) -> bool:
+        """Vrai si la réponse de l'agent doit passer par le reformatage LLM (diffusable en streaming)."""
+        return (
+            bool(raw_text) and not self._already_formatted(raw_text)
+            and "CATEGORY_ERROR:" not in raw_text and '<ul class="event-list">' not in raw_text
+        )
+
+    def _stream_reformatted_response(self, raw_response: str, clean_msg: str, embedding: Optional[np.ndarray],
+                                     detected_category: str, category_context: str,
+                                     profile: str, novelty_future: Optional[Future] = None) -> Iterator[str]:
+        """
+        Reformate la réponse via LLM et envoie le HTML de chaque événement dès qu'il est généré,
+        puis les suggestions ML calculées sur le texte complet.
+        """
+        pieces = []
+        reformat_ok = False
+
+        def reformatted():
+            nonlocal reformat_ok
+            reformat_ok = yield from self._iter_reformat_with_llm(raw_response)
+
+        def collected():
+            for block in reformatted():
+                pieces.append(block)
+                yield block
+
+        def ml_sections():
+            full_response = ''.join(pieces)
+            # Repli sur le texte brut après une erreur LLM: pas mis en cache, le prochain message retentera
+            if reformat_ok and "CATEGORY_ERROR:" not in full_response:
+                self._remember_response(clean_msg, embedding, detected_category, full_response)
+            yield from self._iter_ml_suggestions(full_response, profile, novelty_future)
+
+        yield from self._stream_response_to_html(
+            itertools.chain([f"<!-- CATEGORY:{category_context} -->\n"], collected(), ml_sections()),
+            category_context
+        )
 
-    def _check_and_fix_incomplete_response(self, response: str, user_query: str) -> str:
+    def _check_and_fix_incomplete_response(self, response: str, user_query: str,
+                                           detected_category: Optional[str] = None) -> str:
         """
         Vérifie si la réponse est incomplète (pas d'adresses, URLs) et la corrige.
+        detected_category: catégorie LLM déjà calculée pour user_query (évite un second appel).
         """
         # Check if response has proper formatting with full details
-        has_locations = '📍' in response and len(re.findall(r'📍\s*\S+', response)) >= 2
-        has_urls = '🔗' in response and ('http' in response or 'Lien non disponible' in response)
+        # (tests par sous-chaîne d'abord; le comptage des lieux s'arrête au 2e trouvé)
         has_descriptions = 'Description:' in response
+        has_urls = has_descriptions and '🔗' in response and ('http' in response or 'Lien non disponible' in response)
+        has_locations = has_urls and len(list(itertools.islice(_LOCATION_RE.finditer(response), 2))) == 2
         
-        if has_locations and has_urls and has_descriptions:
+        if has_locations:
             return response  # Already complete
         
-        print("[DEBUG] Response incomplete - fetching full details manually...")
+        logger.debug("Response incomplete - fetching full details manually...")
         
         # Response is incomplete - the agent didn't call Get_Event_Details
         # Try to detect category and fetch events ourselves
-        category = self._detect_category_with_llm(user_query)
+        category = detected_category or self._detect_category_with_llm(user_query)
         if category == 'general':
             category = 'music'  # Default fallback
         
@@ -521,7 +1018,7 @@ CONTRAINTES:
         minimal_events = fetch_all_events_minimal(category)
         
         # Extract first 5 IDs
-        ids = re.findall(r'\[([a-f0-9]{12})\]', minimal_events)
+        ids = _EVENT_ID_RE.findall(minimal_events)
         if not ids:
             return response  # No events found, return original
         
@@ -539,128 +1036,29 @@ CONTRAINTES:
         
         if '<ul class="event-list">' in response:
             return '<div class="response-content">\n' + response + '\n</div>'
-            
-        cleaned = response.replace('```html', '').replace('```', '')
-        
-        # Remove instruction texts that might have leaked through
-        cleaned = re.sub(r'⚠️ IMPORTANT:.*?virgules\)', '', cleaned, flags=re.DOTALL)
-        cleaned = re.sub(r'✅ Voici les détails.*?informations\.', '', cleaned, flags=re.DOTALL)
-        cleaned = re.sub(r'\[Source: \w+\]', '', cleaned)
-        
-        patterns_to_normalize = [
-            (r'\s+(\d+\.\s+\*\*)', r'\n\1'),
-            (r'\s+📅', '\n📅'),
-            (r'\s+📍', '\n📍'),
-            (r'\s+💰', '\n💰'),
-            (r'\s+🔗', '\n🔗'),
-            (r'\s+Description:', '\nDescription:'),
-        ]
-        
-        for pattern, replacement in patterns_to_normalize:
-            cleaned = re.sub(pattern, replacement, cleaned)
-            
-        html_parts = []
-        lines = cleaned.split('\n')
-        
-        current_section = []
-        in_list = False
-        list_items = []
-        current_hidden_info = []
-        current_event_category = category_context.capitalize() if category_context else "General"
-        
-        for line in lines:
-            line = line.strip()
-            
-            section_emojis = ['🎯', '📌', '🌟', '🤖', '🎲', '❌', '📭', '💬', '🔄', '🎬', '🎵', '🎨', '🏃', '🌳', '🍳', '🆓', '🎫', '🎭', '🌐', '💡']
-            if any(line.startswith(x) for x in section_emojis):
-                if list_items:
-                    if current_hidden_info:
-                        list_items[-1] += f'<div class="more-info">{"".join(current_hidden_info)}</div>'
-                        current_hidden_info = []
-                    list_items[-1] += '<div class="click-hint">🔽 Cliquez pour voir les détails</div></li>'
-                    html_parts.append('<ul class="event-list">' + ''.join(list_items) + '</ul>')
-                    list_items = []
-                    in_list = False
-                
-                if current_section:
-                    html_parts.append(f'<div class="section">{" ".join(current_section)}</div>')
-                    current_section = []
-                
-                html_parts.append(f'<h2 class="section-title">{line}</h2>')
-                continue
-            
-            event_match = re.match(r'^(\d+)\.\s+\*\*(.+?)\*\*', line) or re.match(r'^(\d+)\.\s+([A-Z].+)', line)
-            if event_match:
-                if list_items:
-                    if current_hidden_info:
-                        list_items[-1] += f'<div class="more-info">{"".join(current_hidden_info)}</div>'
-                        current_hidden_info = []
-                    list_items[-1] += '<div class="click-hint">🔽 Cliquez pour voir les détails</div></li>'
-                
-                if not in_list:
-                    if current_section:
-                        html_parts.append(f'<div class="section">{" ".join(current_section)}</div>')
-                        current_section = []
-                
-                content = re.sub(r'^\d+\.\s+', '', line)
-                content = content.replace('**', '<strong>', 1).replace('**', '</strong>', 1)
-                
-                event_title = re.sub(r'<[^>]+>', '', content).replace('"', "'")
-                
-                like_btn = f'<button class="like-btn" data-event-title="{event_title}" data-category="{current_event_category}" onclick="toggleLike(event, this)">❤️</button>'
-                
-                list_items.append(f'<li class="event-item" onclick="toggleEvent(this)">{like_btn} {content}')
-                in_list = True
-                continue
-            
-            if in_list:
-                if any(line.startswith(x) for x in ['📅', '📍', '💰', '🆓']):
-                    line_clean = line.replace('**', '')
-                    list_items[-1] += f'<div class="event-detail">{line_clean}</div>'
-                elif line.startswith('🔗'):
-                    url = None
-                    if 'http' in line:
-                        found = re.search(r'(https?://[^\s\)]+)', line)
-                        if found:
-                            url = found.group(1)
-                    
-                    if url:
-                        current_hidden_info.append(f'<div class="event-detail link"><a href="{url}" target="_blank">🔗 Voir le site officiel</a></div>')
-                    else:
-                        current_hidden_info.append('<div class="event-detail">🔗 Lien non disponible</div>')
-                elif line.startswith('Description:'):
-                    desc = line.replace('Description:', '').strip()
-                    current_hidden_info.append(f'<div class="event-description">📝 {desc}</div>')
-                elif line:
-                    current_hidden_info.append(f'<div class="event-info">{line}</div>')
-            elif line:
-                current_section.append(line)
-        
-        if list_items:
-            if current_hidden_info:
-                list_items[-1] += f'<div class="more-info">{"".join(current_hidden_info)}</div>'
-            list_items[-1] += '<div class="click-hint">🔽 Cliquez pour voir les détails</div></li>'
-            html_parts.append('<ul class="event-list">' + ''.join(list_items) + '</ul>')
         
-        if current_section:
-            html_parts.append(f'<div class="section">{" ".join(current_section)}</div>')
+        return ''.join(self._stream_response_to_html((response,), category_context))
 
-        return '<div class="response-content">\n' + '\n'.join(html_parts) + '\n</div>'
+    def _stream_response_to_html(self, chunks: Iterable[str], category_context: str = "General") -> Iterator[str]:
+        """
+        Version streaming de _format_response_to_html : les morceaux de texte
+        sont consommés un par un et chaque bloc HTML est envoyé dès qu'il est prêt.
+        """
+        formatter = _HtmlStreamFormatter(category_context)
+        yield '<div class="response-content">\n'
+        separator = ''
+        for chunk in chunks:
+            for part in formatter.feed(chunk):
+                yield separator + part
+                separator = '\n'
+        for part in formatter.close():
+            yield separator + part
+            separator = '\n'
+        yield '\n</div>'
 
     def _is_activity_search(self, message: str) -> bool:
         """Détecte si le message est une demande d'activités ou une question normale."""
-        msg_lower = message.lower().strip()
-        
-        activity_keywords = [
-            'activ', 'événe', 'sortie', 'cherch', 'veux', 'propos', 'trouv',
-            'ciné', 'cinema', 'cinéma', 'sport', 'musi', 'musique', 'concert', 'expo', 'théâtre', 'theatre',
-            'faire', 'voir', 'cuisine', 'nature', 'gratuit', 'film', 'art', 'show', 'spectacle',
-            'match', 'galerie', 'musée', 'atelier', 'cours', 'balade', 'parc',
-            'aller', 'jouer', 'danser', 'chanter', 'courir', 'marcher', 'randonn'
-        ]
-        
-        is_activity = any(kw in msg_lower for kw in activity_keywords)
-        return is_activity
+        return _ACTIVITY_RE.search(message.lower()) is not None
 
     def _respond_to_casual_question(self, message: str) -> str:
         """Répond poliment aux questions non-liées aux activités."""
@@ -677,65 +1075,98 @@ Réponds en 1-2 phrases max, sois naturel et sympa."""
             text = response.content if hasattr(response, 'content') else str(response)
             return f'<div class="response-content"><p>{text}</p></div>'
         except Exception as e:
-            print(f"[DEBUG] Erreur réponse casual: {e}")
+            logger.warning("Erreur réponse casual: %s", e)
             return '<div class="response-content"><p>Bonjour ! Comment puis-je t\'aider à trouver une activité à Bruxelles ? 😊</p></div>'
 
-    def _category_context_from_message(self, message: str) -> str:
+    def _category_context_from_message(self, message: str, detected_category: Optional[str] = None) -> str:
         """Déduit une catégorie normalisée pour les likes (Music/Sport/Cinema/Art/Nature/General)."""
-        detected = self._detect_category_with_llm(message)
-        mapping = {
-            'music': 'Music',
-            'sport': 'Sport',
-            'cinema': 'Cinema',
-            'theatre': 'Cinema',
-            'art': 'Art',
-            'nature': 'Nature',
-        }
-        return mapping.get(detected, 'General')
+        detected = detected_category or self._detect_category_with_llm(message)
+        return DETECT_TO_ML.get(detected, 'General')
 
     def chat(self, user_input: str) -> str:
         """
         Main chat interface with ML-enhanced recommendations.
         """
+        return ''.join(self.chat_stream(user_input))
+
+    def chat_stream(self, user_input: str) -> Iterator[str]:
+        """
+        Même logique que chat() mais renvoie le HTML par fragments :
+        les événements principaux partent dès que l'agent a répondu,
+        les suggestions ML suivent quand elles sont générées.
+        """
+        novelty_future = None
         try:
             # Step 0: Profil optionnel passé via tag [PROFILE:XXX]
             tag_profile, clean_msg = self._extract_profile_tag(user_input)
             
             # Step 1: Vérifier si c'est une demande d'activités
             if not self._is_activity_search(clean_msg):
-                print(f"[DEBUG] Question casual détectée: '{clean_msg[:50]}...'")
-                return self._respond_to_casual_question(clean_msg)
+                logger.debug("Question casual détectée: '%s...'", clean_msg[:50])
+                yield self._respond_to_casual_question(clean_msg)
+                return
             
             # Step 2: C'est une demande d'activités
             profile = tag_profile or self._detect_profile_context(clean_msg)
-            print(f"[DEBUG] Demande d'activités - Profil détecté: {profile} (tag={tag_profile})")
-            category_context = self._category_context_from_message(clean_msg)
-            print(f"[DEBUG] Catégorie contexte pour likes: {category_context}")
+            logger.debug("Demande d'activités - Profil détecté: %s (tag=%s)", profile, tag_profile)
+            # La nouveauté ne dépend que du profil: on la génère pendant que l'agent travaille
+            novelty_future = self._post_pool.submit(self._generate_novelty, profile)
+            # Catégorie LLM calculée une seule fois: contexte des likes + correction d'une réponse incomplète
+            detected_category = self._detect_category_with_llm(clean_msg)
+            category_context = self._category_context_from_message(clean_msg, detected_category)
+            logger.debug("Catégorie contexte pour likes: %s", category_context)
             
-            # Step 3: Exécuter l'agent principal
-            raw_response = self.agent.run(input=clean_msg)
-            
-            # Step 3.1: Check if response is incomplete (missing URLs, addresses)
-            raw_response = self._check_and_fix_incomplete_response(raw_response, clean_msg)
-            
-            # Step 3.2: Forcer le reformatage si nécessaire
-            raw_response = self._force_reformat_with_llm(raw_response)
+            # Step 3: Exécuter l'agent principal (sauf si une recherche quasi identique est en cache).
+            # Clé = catégorie détectée (plusieurs catégories partagent un même category_context);
+            # cache vide: pas d'encodage avant l'agent, l'embedding est calculé une fois la réponse envoyée
+            embedding = self._embed(clean_msg) if self._session_cache else None
+            raw_response = None
+            if embedding is not None:
+                raw_response = self._lookup_session_cache(embedding, detected_category)
+            remember = raw_response is None
+            if raw_response is not None:
+                logger.debug("Session cache hit for '%s'", clean_msg[:50])
+            else:
+                raw_response = self.agent.run(input=clean_msg)
+                self._trim_memory()
+                
+                # Step 3.1: Check if response is incomplete (missing URLs, addresses)
+                raw_response = self._check_and_fix_incomplete_response(raw_response, clean_msg, detected_category)
+                
+                # Step 3.2: Forcer le reformatage si nécessaire (diffusé au fil de la génération)
+                if self._needs_llm_reformat(raw_response):
+                    yield from self._stream_reformatted_response(raw_response, clean_msg, embedding,
+                                                                 detected_category, category_context,
+                                                                 profile, novelty_future)
+                    return
+                raw_response = self._force_reformat_with_llm(raw_response)
             
             # Step 3.5: Vérifier s'il y a une erreur de catégorie
             if "CATEGORY_ERROR:" in raw_response:
-                return self._format_response_to_html(raw_response.replace("CATEGORY_ERROR:", "❌"), category_context)
+                novelty_future.cancel()
+                yield self._format_response_to_html(raw_response.replace("CATEGORY_ERROR:", "❌"), category_context)
+                return
             
-            # Step 4: Ajouter les suggestions ML (avec VRAIS événements)
-            enhanced_response = self._add_ml_suggestions_to_response(raw_response, profile)
-
-            # Injecter la catégorie en commentaire pour le parser HTML
-            enhanced_response = f"<!-- CATEGORY:{category_context} -->\n" + enhanced_response
+            # Réponse déjà en HTML: pas de parsing incrémental possible
+            if '<ul class="event-list">' in raw_response:
+                enhanced_response = self._add_ml_suggestions_to_response(raw_response, profile, novelty_future)
+                yield self._format_response_to_html(f"<!-- CATEGORY:{category_context} -->\n" + enhanced_response, category_context)
+                if remember:
+                    self._remember_response(clean_msg, embedding, detected_category, raw_response)
+                return
             
-            # Step 5: Formatter en HTML
-            return self._format_response_to_html(enhanced_response, category_context)
+            # Step 4 + 5: Formatter en HTML au fil de l'eau
+            # (catégorie injectée en commentaire, puis événements, puis suggestions ML avec VRAIS événements)
+            chunks = [f"<!-- CATEGORY:{category_context} -->\n" + raw_response]
+            yield from self._stream_response_to_html(
+                itertools.chain(chunks, self._iter_ml_suggestions(raw_response, profile, novelty_future)),
+                category_context
+            )
+            if remember:
+                self._remember_response(clean_msg, embedding, detected_category, raw_response)
             
         except Exception as e:
-            print(f"[ERROR] Erreur dans chat(): {e}")
-            import traceback
-            traceback.print_exc()
-            return f"<p>Une erreur est survenue: {str(e)}</p>"
\ No newline at end of file
+            if novelty_future is not None:
+                novelty_future.cancel()
+            logger.exception("Erreur dans chat(): %s", e)
+            yield f"<p>Une erreur est survenue: {str(e)}</p>"
@@ -1,6 +1,8 @@
 import os
+import logging
 import threading
-from flask import Flask, render_template, request, jsonify
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 from newAgent import NewAgent
 from testAgent import testAgent
 from recommender import SocialRecommender
@@ -11,7 +13,12 @@ from codecarbon import EmissionsTracker
 
 load_dotenv()
 
+# DEBUG pour voir les traces de l'agent (LOG_LEVEL=DEBUG), INFO par défaut
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+
 app = Flask(__name__)
+# Message d'accueil de /onboarding: template Jinja compilé une seule fois au démarrage
+welcome_template = app.jinja_env.get_template('welcome_fragment.html')
 
 # --- Background Cache Warmup ---
 def warmup_cache():
@@ -22,8 +29,19 @@ def warmup_cache():
     except Exception as e:
         print(f"❌ Background fetch failed: {e}")
 
-# Start the thread immediately
-threading.Thread(target=warmup_cache, daemon=True).start()
+# Start the warmup immediately; le Future permet aux routes de chat d'attendre qu'il se termine
+_warmup_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmup")
+warmup_future = _warmup_pool.submit(warmup_cache)
+_WARMUP_WAIT = 5  # secondes max d'attente par requête, ensuite on continue sans
+
+def _wait_for_warmup():
+    """Laisse le préchargement EventBrite finir avant d'interroger l'agent (cache partiel sinon)."""
+    if warmup_future.done():
+        return
+    try:
+        warmup_future.result(timeout=_WARMUP_WAIT)
+    except FuturesTimeoutError:
+        print("⏳ EventBrite warmup still running, continuing without waiting")
 
 # Initialize Agent
 try:
@@ -33,13 +51,31 @@ except Exception as e:
     print(f"❌ Error initializing agent: {e}")
     agent = None
 
-# Initialize ML Engine (Optional)
-try:
-    rec_engine = SocialRecommender()
-    print("✅ ML Engine loaded successfully")
-except Exception as e:
-    print(f"⚠️ Warning: ML Engine not loaded ({e})")
-    rec_engine = None
+# Initialize ML Engine (Optional) - chargé en arrière-plan comme le cache EventBrite:
+# tant qu'il n'est pas prêt, rec_engine vaut None et les routes fonctionnent sans voisin ML
+rec_engine = None
+rec_ready = threading.Event()
+_REC_READY_WAIT = 5  # secondes max d'attente du chargement dans /onboarding
+
+def _init_rec_engine():
+    global rec_engine
+    try:
+        rec_engine = SocialRecommender()
+        print("✅ ML Engine loaded successfully")
+    except Exception as e:
+        print(f"⚠️ Warning: ML Engine not loaded ({e})")
+    finally:
+        rec_ready.set()
+
+threading.Thread(target=_init_rec_engine, daemon=True).start()
+
+# Le serveur traite les requêtes sur plusieurs threads, mais l'agent (mémoire LangChain, préférences,
+# cache de session) n'est pas thread-safe: tout appel à l'agent se fait sous _agent_lock, sauf la
+# classification LLM de /like (le cache de catégories a son propre verrou dans l'agent).
+# Le profil a son propre verrou pour que /onboarding et /like n'attendent pas la fin d'une réponse en cours.
+# Ordre d'acquisition fixe quand les deux sont pris: _agent_lock puis _profile_lock.
+_agent_lock = threading.Lock()
+_profile_lock = threading.Lock()
 
 # Global User State (Demo only)
 user_profile = {
@@ -57,36 +93,27 @@ def onboarding():
     choices = data.get('choices', [])
     
     # 1. Reset & Weights
-    user_profile["vector"] = {"Music": 0.1, "Sport": 0.1, "Cinema": 0.1, "Art": 0.1, "Nature": 0.1}
+    vector = {"Music": 0.1, "Sport": 0.1, "Cinema": 0.1, "Art": 0.1, "Nature": 0.1}
     weights = [0.9, 0.6, 0.4]
     for i, category in enumerate(choices):
-        if i < len(weights) and category in user_profile["vector"]:
-            user_profile["vector"][category] = weights[i]
+        if i < len(weights) and category in vector:
+            vector[category] = weights[i]
 
     # 2. ML & Message
     neighbor_info = {"matched_archetype": "New User"}
-    if rec_engine:
-        try:
-            neighbor = rec_engine.find_similar_user(user_profile["vector"])
-            user_profile["neighbor"] = neighbor
-            neighbor_info = neighbor
-        except Exception as e:
-            print(f"Error finding similar user: {e}")
-
-    welcome_text = f"""
-    Merci d'avoir répondu à ces questions !<br><br>
-    Je vois que tu es un profil de type <strong>{neighbor_info.get('matched_archetype', 'Explorateur')}</strong>.
-    <br><br>
-    <strong>👇 Qu'est-ce qui te ferait plaisir aujourd'hui ?</strong>
-    
-    <div class="main-menu-container">
-        <button class="menu-btn main" onclick="showSubMenu('music')">🎵 Musique & Concerts</button>
-        <button class="menu-btn main" onclick="showSubMenu('culture')">🎨 Culture & Sorties</button>
-        <button class="menu-btn main" onclick="showSubMenu('sport')">🏃 Sport & Bien-être</button>
-        <button class="menu-btn main" onclick="showSubMenu('nature')">🌳 Nature & Plein air</button>
-    </div>
-    <div id="sub-menu-container" class="sub-menu-container"></div>
-    """
+    # Onboarding juste après le démarrage: on laisse au moteur ML le temps de finir de charger
+    rec_ready.wait(timeout=_REC_READY_WAIT)
+    with _profile_lock:
+        user_profile["vector"] = vector
+        if rec_engine:
+            try:
+                neighbor = rec_engine.find_similar_user(vector)
+                user_profile["neighbor"] = neighbor
+                neighbor_info = neighbor
+            except Exception as e:
+                print(f"Error finding similar user: {e}")
+
+    welcome_text = welcome_template.render(archetype=neighbor_info.get('matched_archetype', 'Explorateur'))
     
     return jsonify({
         "status": "success", 
@@ -98,9 +125,62 @@ def onboarding():
 @app.route('/like', methods=['POST'])
 def like_event():
     """Gère le Like/Unlike - Logic moved to like_handler.py"""
-    result = handle_like(request.json, user_profile, agent, rec_engine)
+    # Pas de _agent_lock: il est tenu pendant toute une réponse diffusée, et la classification
+    # LLM de l'agent protège déjà son propre cache
+    with _profile_lock:
+        result = handle_like(request.json, user_profile, agent, rec_engine)
     return jsonify(result)
 
+def _prepare_agent_message(user_msg):
+    """
+    Synchronise le profil vers l'agent et ajoute le tag [PROFILE:...] si connu (appelé sous _agent_lock).
+    Renvoie (message, préférences de l'agent avant le chat) pour _sync_profile_from_agent.
+    """
+    prefs_before = None
+    with _profile_lock:
+        neighbor = user_profile.get("neighbor")
+        # Sync user_profile to agent's internal preferences (for consistency)
+        # Le setter recopie déjà les valeurs dans le vecteur de l'agent: pas de .copy() ici
+        if hasattr(agent, 'user_preferences'):
+            agent.user_preferences = user_profile["vector"]
+            agent.interaction_count = max(agent.interaction_count, 2)  # Ensure ML kicks in
+            prefs_before = agent.user_preferences
+    
+    # Basic Chat - The agent now handles ML internally via _detect_category_with_llm
+    # No need to inject hidden instructions anymore - it's all in the agent
+    # If we have a neighbor archetype from ML engine, pass it as profile tag
+    if neighbor and neighbor.get("matched_archetype"):
+        archetype = neighbor.get("matched_archetype")
+        return f"[PROFILE:{archetype}] {user_msg}", prefs_before
+    return user_msg, prefs_before
+
+def _sync_profile_from_agent(prefs_before):
+    """Récupère les préférences mises à jour par l'agent et recalcule le voisin (appelé sous _agent_lock)."""
+    # Sync back agent's updated preferences to user_profile
+    if hasattr(agent, 'user_preferences'):
+        # Le getter renvoie déjà un nouveau dict
+        updated = agent.user_preferences
+        # L'agent n'a rien modifié pendant le chat: on ne réécrit pas le profil, sinon un
+        # /onboarding arrivé pendant la diffusion serait écrasé par l'ancien vecteur
+        if updated == prefs_before:
+            return
+        with _profile_lock:
+            user_profile["vector"] = updated
+            # Update neighbor based on new preferences
+            if rec_engine:
+                try:
+                    # Vecteur NumPy de l'agent (même ordre de colonnes) plutôt que le dict
+                    prefs = getattr(agent, 'preference_vector', updated)
+                    user_profile["neighbor"] = rec_engine.find_similar_user(prefs)
+                except:
+                    pass
+
+def _reset_agent():
+    if hasattr(agent, 'reset_preferences'):
+        agent.reset_preferences()
+    elif hasattr(agent, 'memory'):
+        agent.memory.clear()
+
 @app.route('/chat', methods=['POST'])
 def chat():
     if not agent:
@@ -111,48 +191,52 @@ def chat():
     
     # Reset
     if user_msg.lower() in ['reset', 'recommencer', 'nouveau']:
-        if hasattr(agent, 'reset_preferences'):
-            agent.reset_preferences()
-        elif hasattr(agent, 'memory'):
-            agent.memory.clear()
+        with _agent_lock:
+            _reset_agent()
         return jsonify({'response': "Conversation réinitialisée !"})
     
-    # Sync user_profile to agent's internal preferences (for consistency)
-    if hasattr(agent, 'user_preferences'):
-        agent.user_preferences = user_profile["vector"].copy()
-        agent.interaction_count = max(agent.interaction_count, 2)  # Ensure ML kicks in
-    
-    # Basic Chat - The agent now handles ML internally via _detect_category_with_llm
-    # No need to inject hidden instructions anymore - it's all in the agent
     try:
-        # If we have a neighbor archetype from ML engine, pass it as profile tag
-        if user_profile.get("neighbor") and user_profile["neighbor"].get("matched_archetype"):
-            archetype = user_profile["neighbor"].get("matched_archetype")
-            user_msg_to_send = f"[PROFILE:{archetype}] {user_msg}"
-        else:
-            user_msg_to_send = user_msg
-
-        response = agent.chat(user_msg_to_send)
-        
-        # Sync back agent's updated preferences to user_profile
-        if hasattr(agent, 'user_preferences'):
-            user_profile["vector"] = agent.user_preferences.copy()
-            # Update neighbor based on new preferences
-            if rec_engine:
-                try:
-                    user_profile["neighbor"] = rec_engine.find_similar_user(user_profile["vector"])
-                except:
-                    pass
-        
+        _wait_for_warmup()
+        with _agent_lock:
+            message, prefs_before = _prepare_agent_message(user_msg)
+            response = agent.chat(message)
+            _sync_profile_from_agent(prefs_before)
         return jsonify({'response': response})
     except Exception as e:
         print(f"Error in chat: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Comme /chat mais envoie le HTML au fil de l'eau (événements puis suggestions ML)."""
+    if not agent:
+        return jsonify({'error': 'Agent not initialized'}), 500
+
+    user_msg = request.json.get('message', '').strip()
+    if not user_msg: return jsonify({'error': 'Message vide'}), 400
+    
+    # Reset
+    if user_msg.lower() in ['reset', 'recommencer', 'nouveau']:
+        with _agent_lock:
+            _reset_agent()
+        return Response("Conversation réinitialisée !", mimetype='text/html')
+
+    def generate():
+        _wait_for_warmup()
+        # Le verrou est tenu pendant toute la diffusion (relâché aussi si le client se déconnecte)
+        with _agent_lock:
+            message, prefs_before = _prepare_agent_message(user_msg)
+            yield from agent.chat_stream(message)
+            _sync_profile_from_agent(prefs_before)
+
+    return Response(stream_with_context(generate()), mimetype='text/html')
+
 @app.route('/reset', methods=['POST'])
 def reset_chat():
-    if agent and hasattr(agent, 'memory'):
-        agent.memory.clear()
+    # Même réinitialisation que "reset" dans le chat: mémoire, préférences et cache de session
+    if agent:
+        with _agent_lock:
+            _reset_agent()
     return jsonify({'status': 'success'})
 
 if __name__ == '__main__':
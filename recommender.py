@@ -1,63 +1,112 @@
 import pandas as pd
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
 import os
 
+# Ordre fixe des colonnes de préférences (partagé avec le vecteur NewAgent.preference_vector)
+from categories import FEATURE_COLS
+
 class SocialRecommender:
     def __init__(self, dataset_path="users_dataset.csv"):
         self.dataset_path = dataset_path
-        self.model = NearestNeighbors(n_neighbors=1, algorithm='brute', metric='cosine')
         self.df = None
-        self.feature_columns = ["Music", "Sport", "Cinema", "Art", "Nature"]
+        self.X_raw = None
+        self.X_norm = None
+        self.strong07 = {}
+        self.strong05 = {}
+        self.feature_columns = list(FEATURE_COLS)
+        self.col_index = {col: i for i, col in enumerate(self.feature_columns)}
         
         self._load_and_train()
     
     def _load_and_train(self):
-        """Charge le dataset et entraîne le modèle KNN"""
+        """Charge le dataset et prépare la matrice normalisée pour le KNN cosinus"""
         if not os.path.exists(self.dataset_path):
             # Si le CSV n'existe pas, on lance une erreur explicite
             raise FileNotFoundError(f"Le fichier {self.dataset_path} est introuvable. Lance 'generate_data.py' d'abord.")
             
         self.df = pd.read_csv(self.dataset_path)
         
-        # On extrait uniquement les colonnes chiffrées pour le ML
-        X = self.df[self.feature_columns].values
-        self.model.fit(X)
+        # On extrait uniquement les colonnes chiffrées pour le ML (valeurs brutes pour les seuils,
+        # matrice contiguë float32 pour le KNN)
+        self.X_raw = self.df[self.feature_columns].to_numpy()
+        X = np.ascontiguousarray(self.X_raw, dtype=np.float32)
+        # Normalisation L2 faite une seule fois: la similarité cosinus devient un simple produit scalaire
+        self.X_norm = X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12)
+        # Profils "forts" par catégorie, calculés une fois pour find_routine_breaker
+        self.strong07 = {col: np.flatnonzero(self.X_raw[:, i] > 0.7) for col, i in self.col_index.items()}
+        self.strong05 = {col: np.flatnonzero(self.X_raw[:, i] > 0.5) for col, i in self.col_index.items()}
         print("🤖 Modèle KNN entraîné sur", len(self.df), "utilisateurs fictifs.")
 
-    def find_similar_user(self, user_preferences):
-        """Trouve le voisin le plus proche (Profil Similaire)"""
-        # Conversion du vecteur dict -> list ordonnée
-        query_vector = []
-        for col in self.feature_columns:
-            query_vector.append(user_preferences.get(col, 0.0))
-        
-        query_vector = np.array(query_vector).reshape(1, -1)
-        
-        # Trouver le voisin
-        distances, indices = self.model.kneighbors(query_vector)
-        
-        neighbor_idx = indices[0][0]
-        neighbor_dist = distances[0][0]
+    def _as_array(self, user_preferences, dtype):
+        """dict {catégorie: score} ou ndarray (ordre feature_columns) -> nouveau vecteur (n,)"""
+        if isinstance(user_preferences, np.ndarray):
+            return user_preferences.astype(dtype).reshape(-1)
+        return np.fromiter(
+            (user_preferences.get(col, 0.0) for col in self.feature_columns),
+            dtype=dtype, count=len(self.feature_columns)
+        )
+
+    def _to_query_vector(self, user_preferences):
+        """Préférences -> vecteur (n,) float32 normalisé"""
+        q = self._as_array(user_preferences, np.float32)
+        q /= np.linalg.norm(q) + 1e-12
+        return q
+
+    def _neighbor_info(self, neighbor_idx, similarity):
+        """Ligne du dataset -> dictionnaire renvoyé au front"""
         neighbor_data = self.df.iloc[neighbor_idx]
         
         return {
             "matched_user_id": neighbor_data["User_ID"],
             "matched_archetype": neighbor_data["Archetype"],
-            "similarity_score": round(1 - neighbor_dist, 4),
+            "similarity_score": round(float(similarity), 4),
             "recommended_activity_type": neighbor_data["Favorite_Event"] 
         }
 
+    def find_similar_user(self, user_preferences):
+        """Trouve le voisin le plus proche (Profil Similaire)"""
+        # Conversion du vecteur dict -> vecteur ordonné (ou ndarray déjà prêt)
+        query_vector = self._to_query_vector(user_preferences)
+        
+        # Trouver le voisin: cosinus = produit scalaire sur les vecteurs normalisés
+        sims = self.X_norm @ query_vector
+        neighbor_idx = int(sims.argmax())
+        return self._neighbor_info(neighbor_idx, sims[neighbor_idx])
+
+    def find_top_similar_users(self, user_preferences, k=3):
+        """Les k voisins les plus proches, du plus similaire au moins similaire"""
+        query_vector = self._to_query_vector(user_preferences)
+        sims = self.X_norm @ query_vector
+        k = min(k, len(sims))
+        if k <= 0:
+            return []
+        # Sélection partielle O(n) puis tri des k seuls candidats
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind='stable')]
+        return [self._neighbor_info(int(idx), sims[idx]) for idx in top]
+
+    def find_similar_users_batch(self, preferences_list):
+        """Comme find_similar_user pour plusieurs profils, en un seul produit matriciel"""
+        if not preferences_list:
+            return []
+        # Q: (n_features, n_requêtes), une colonne par profil normalisé
+        Q = np.stack([self._to_query_vector(p) for p in preferences_list], axis=1)
+        sims = self.X_norm @ Q
+        neighbor_idxs = sims.argmax(axis=0)
+        return [self._neighbor_info(int(idx), sims[idx, j]) for j, idx in enumerate(neighbor_idxs)]
+
     def find_routine_breaker(self, user_preferences):
-        lowest_category = min(user_preferences, key=user_preferences.get)
+        prefs = self._as_array(user_preferences, np.float64)
+        lowest_category = self.feature_columns[int(prefs.argmin())]
         
-        opposites = self.df[self.df[lowest_category] > 0.7]
+        # Indices précalculés des profils forts dans cette catégorie
+        opposites = self.strong07[lowest_category]
         
-        if opposites.empty:
-            opposites = self.df[self.df[lowest_category] > 0.5]
+        if opposites.size == 0:
+            opposites = self.strong05[lowest_category]
             
-        if not opposites.empty:
-            opposite_user = opposites.sample(1).iloc[0]
+        if opposites.size:
+            opposite_user = self.df.iloc[int(np.random.choice(opposites))]
             return {
                 "category": lowest_category,
                 "archetype": opposite_user["Archetype"],
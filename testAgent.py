@@ -1,7 +1,8 @@
 import os
 from pydoc import text
 import re
-import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Optional, Tuple
 from langchain_mistralai import ChatMistralAI
 from langchain.memory import ConversationBufferMemory
@@ -11,6 +12,62 @@ from toolsFolder.eventBrusselsTool import get_brussels_events_for_llm
 from toolsFolder.ticketMasterTool import get_ticketmaster_events_for_llm
 from toolsFolder.eventCache import event_cache
 
+# Préfixes de lignes reconnus par _format_to_html
+_SECTION_PREFIXES = ('🎲', '🤖')
+_DETAIL_PREFIXES = ('📅', '📍', '💰')
+
+# Regex utilisées à chaque réponse (compilées une seule fois)
+_EVENT_TITLE_RE = re.compile(r'^(\d+)\.\s+\*\*(.+?)\*\*')
+_URL_RE = re.compile(r'(https?://[^\s]+)')
+_ID12_RE = re.compile(r'[a-f0-9]{12}')
+_ID_BRACKET_RE = re.compile(r'\[([a-f0-9]{12})\]')
+
+# Classification locale des demandes (sans appel LLM): première catégorie dont un mot-clé apparaît.
+# Même vocabulaire que le prompt de _detect_category, qui reste le repli si rien ne correspond.
+_CATEGORY_PATTERNS = (
+    ("music", re.compile(r"\b(?:concerts?|dj|musiques?|musical|jazz|rock|rap|électro|electro)\b")),
+    ("sport", re.compile(r"\b(?:sports?|sporti(?:f|ve)s?|match(?:s|es)?|yoga|fitness|randonnées?|foot(?:ball)?|basket|tennis|running|padel|vélo)\b")),
+    ("cinema", re.compile(r"\b(?:cinéma|cinema|ciné|films?|projections?|documentaires?)\b")),
+    ("theatre", re.compile(r"\b(?:théâtre|theatre|spectacles?|pièces?|stand-up|humour)\b")),
+    ("art", re.compile(r"\b(?:expos?|expositions?|musées?|galeries?|arts?|vernissages?)\b")),
+    ("nature", re.compile(r"\b(?:parcs?|balades?|jardins?|nature|forêts?|promenades?|plein air)\b")),
+    ("family", re.compile(r"\b(?:enfants?|famille|familial(?:e|es)?|kids)\b")),
+    ("party", re.compile(r"\b(?:clubbing|clubs?|boîtes?|nightlife|fêtes?|soirées?|party)\b")),
+    ("festival", re.compile(r"\b(?:festivals?)\b")),
+)
+
+# Prompt de sélection des IDs: consignes fixes en tête (préfixe identique d'un appel à l'autre),
+# puis la liste d'événements, coupée sur une fin de ligne à ~750 tokens (≈ 4 caractères par token)
+_SELECT_PROMPT_PREFIX = """Tu es un assistant de recommandation d'événements à Bruxelles.
+Tu dois TOUJOURS rester poli et professionnel. Si la demande est inappropriée, refuse poliment.
+Choisis les 5 meilleurs IDs pour la demande de l'utilisateur (en fin de message) parmi les événements ci-dessous.
+Réponds UNIQUEMENT avec les 5 IDs séparés par des virgules, rien d'autre.
+Exemple: abc123,def456,ghi789,jkl012,mno345"""
+_SELECT_EVENTS_MAX_CHARS = 3000
+
+# Mots-clés par profil pour la suggestion ML: une regex par profil (lookahead pour trouver
+# aussi les mots qui se chevauchent); le score d'un événement = nombre de mots-clés distincts trouvés
+_PROFILE_KEYWORDS = {
+    "Fêtard": ["party", "club", "dj", "night", "dance", "soirée"],
+    "Culturel": ["musée", "expo", "art", "galerie", "culture", "patrimoine"],
+    "Sportif": ["sport", "match", "fitness", "run", "vélo", "yoga"],
+    "Cinéphile": ["film", "cinema", "projection", "documentaire"],
+    "Chill": ["nature", "parc", "balade", "détente", "calme"],
+    "Curieux": []
+}
+_PROFILE_SCORE_PATTERNS = {
+    profile: re.compile('(?=(' + '|'.join(map(re.escape, keywords)) + '))')
+    for profile, keywords in _PROFILE_KEYWORDS.items() if keywords
+}
+
+# Cache des réponses HTML: même demande (normalisée) -> pas d'appel LLM ni d'API pendant 15 minutes
+_RESPONSE_CACHE_TTL = 900
+_RESPONSE_CACHE_SIZE = 256
+_NON_WORD_RE = re.compile(r'[^\w]+')
+
+# Les trois sources sont indépendantes: un pool partagé les interroge en parallèle
+_EVENT_POOL = ThreadPoolExecutor(max_workers=3, thread_name_prefix="test-event-fetch")
+
 
 def fetch_all_events_minimal(category: str) -> str:
     """Fetches MINIMAL event data from all sources."""
@@ -31,37 +88,44 @@ def fetch_all_events_minimal(category: str) -> str:
     cat_lower = category.lower().strip()
     
     #If it's one of the main categories we map it to both brussels and ticketmasters correct categories
-    if cat_lower in mapping:
-        categoryBru, categoryTM = mapping[cat_lower]
-    results = []
+    if cat_lower not in mapping:
+        # Catégorie inconnue: aucune source ne peut être interrogée
+        print(f"DEBUG: Unknown category: {category}")
+        return ""
+    categoryBru, categoryTM = mapping[cat_lower]
+
+    jobs = (
+        ("EventBrite", get_eventBrite_events_for_llm, {"category_filter": categoryTM}),
+        ("Brussels", get_brussels_events_for_llm, {"category": categoryBru}),
+        ("TicketMaster", get_ticketmaster_events_for_llm, {"classificationName": categoryTM}),
+    )
+    futures = {_EVENT_POOL.submit(fn, **kw): name for name, fn, kw in jobs}
+    by_source = {}
+    for future in as_completed(futures):
+        name = futures[future]
+        try:
+            by_source[name] = future.result()
+        except Exception as e:
+            print(f"DEBUG: {name} error: {e}")
 
-    
-    try:
-        eb_res = get_eventBrite_events_for_llm(category_filter=categoryTM)
-        results.append(eb_res)
-    except Exception as e:
-        print(f"DEBUG: EventBrite error: {e}")
-
-    try:
-        bru_res = get_brussels_events_for_llm(category=categoryBru)
-        results.append(bru_res)
-    except Exception as e:
-        print(f"DEBUG: Brussels error: {e}")
-
-    try:
-        tm_res = get_ticketmaster_events_for_llm(classificationName=categoryTM)
-        results.append(tm_res)
-    except Exception as e:
-        print(f"DEBUG: TicketMaster error: {e}")
-    
+    # Ordre fixe des sources, quel que soit l'ordre d'arrivée
+    results = [by_source[name] for name, _, _ in jobs if name in by_source]
     return "\n\n".join(results)
 
 
+def _truncate_lines(text: str, max_chars: int) -> str:
+    """Tronque à max_chars sans couper une ligne d'événement en deux."""
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind('\n', 0, max_chars)
+    return text[:cut] if cut > 0 else text[:max_chars]
+
+
 def get_full_event_details(event_ids: List[str]) -> List[dict]:
     """Get full event details from cache - NO LLM needed."""
     results = []
-    for event_id in event_ids:
-        event = event_cache.get_event(event_id.strip())
+    # Une seule recherche groupée dans le cache pour tous les IDs
+    for event in event_cache.get_events_batch([event_id.strip() for event_id in event_ids]):
         if event:
             # Clean up the data
             date = event.get('date') or event.get('date_start') or 'Date inconnue'
@@ -127,9 +191,17 @@ class testAgent:
             'Music': 0.0, 'Sport': 0.0, 'Cinema': 0.0, 'Art': 0.0, 'Nature': 0.0
         }
 
+        # requête normalisée -> (timestamp, HTML)
+        self._response_cache: Dict[str, Tuple[float, str]] = {}
+
 
     def _detect_category(self, text: str) -> str:
-        """Quick category detection - minimal LLM call."""
+        """Quick category detection - keywords first, minimal LLM call only if nothing matches."""
+        lowered = text.lower()
+        for category, pattern in _CATEGORY_PATTERNS:
+            if pattern.search(lowered):
+                return category
+
         prompt = f"""Classifie ce texte dans UNE SEULE catégorie:
         Texte: "{text}"
 
@@ -160,27 +232,28 @@ class testAgent:
 
     def _select_events_with_llm(self, minimal_events: str, user_query: str) -> List[str]:
         """LLM picks 5 best event IDs - THE ONLY REAL LLM WORK."""
-        prompt = f"""Utilisateur cherche: "{user_query}"
-
+        prompt = f"""{_SELECT_PROMPT_PREFIX}
 Événements disponibles (format: [ID] Nom | Date | Description):
-{minimal_events[:3000]}
+{_truncate_lines(minimal_events, _SELECT_EVENTS_MAX_CHARS)}
 
-Tu es un assistant de recommandation d'événements à Bruxelles.
-Tu dois TOUJOURS rester poli et professionnel. Si la demande est inappropriée, refuse poliment.
-Choisis les 5 meilleurs IDs pour cette demande.
-Réponds UNIQUEMENT avec les 5 IDs séparés par des virgules, rien d'autre.
-Exemple: abc123,def456,ghi789,jkl012,mno345"""
+Utilisateur cherche: "{user_query}"
+"""
 
         try:
-            response = self.llm.invoke(prompt)
-            ids_text = str(response.content).strip()
-            # Extract IDs (12 hex chars)
-            ids = re.findall(r'[a-f0-9]{12}', ids_text)
+            # Réponse lue en streaming: on s'arrête dès que 5 IDs sont complets (fin de génération inutile)
+            ids_text = ''
+            ids = []
+            for chunk in self.llm.stream(prompt):
+                ids_text += str(chunk.content)
+                # Extract IDs (12 hex chars)
+                ids = _ID12_RE.findall(ids_text)
+                if len(ids) >= 5:
+                    break
             return ids[:5]
         except Exception as e:
             print(f"[ERROR] LLM selection failed: {e}")
             # Fallback: extract first 5 IDs from minimal_events
-            return re.findall(r'\[([a-f0-9]{12})\]', minimal_events)[:5]
+            return _ID_BRACKET_RE.findall(minimal_events)[:5]
 
     def _detect_profile(self, msg: str) -> str:
         """Simple profile detection - NO LLM."""
@@ -198,21 +271,14 @@ Exemple: abc123,def456,ghi789,jkl012,mno345"""
             return ""
         
         # Simple scoring based on profile keywords
-        profile_keywords = {
-            "Fêtard": ["party", "club", "dj", "night", "dance", "soirée"],
-            "Culturel": ["musée", "expo", "art", "galerie", "culture", "patrimoine"],
-            "Sportif": ["sport", "match", "fitness", "run", "vélo", "yoga"],
-            "Cinéphile": ["film", "cinema", "projection", "documentaire"],
-            "Chill": ["nature", "parc", "balade", "détente", "calme"],
-            "Curieux": []
-        }
-        
-        keywords = profile_keywords.get(profile, [])
+        pattern = _PROFILE_SCORE_PATTERNS.get(profile)
         best_event = events[0]  # Default to first
         best_score = 0
         
-        for event in events:
-            score = sum(1 for kw in keywords if kw in (event.get('name', '') + event.get('description', '')).lower())
+        # Sans mots-clés (profil Curieux), on garde le premier événement
+        for event in (events if pattern is not None else ()):
+            text = (event.get('name', '') + event.get('description', '')).lower()
+            score = len({m.group(1) for m in pattern.finditer(text)})
             if score > best_score:
                 best_score = score
                 best_event = event
@@ -237,11 +303,10 @@ Description: {best_event['description'][:300]}"""
         }
         
         # Get random event from cache
-        all_cached = list(event_cache.events.values())
-        if not all_cached:
+        event = event_cache.random_event()
+        if event is None:
             return ""
         
-        event = random.choice(all_cached)
         date = event.get('date') or event.get('date_start', 'Date inconnue')
         
         return f"""
@@ -264,23 +329,26 @@ Description: {(event.get('description') or '')[:300]}"""
         html_parts = ['<div class="response-content">']
         current_event_category = category.capitalize() if category else "General"
         
-        lines = response.split('\n')
         in_event = False
         current_hidden_info = []
         
+        def close_event(end='</li>'):
+            # Ferme l'événement en cours: infos cachées puis indice de clic
+            if current_hidden_info:
+                html_parts.append(f'<div class="more-info">{"".join(current_hidden_info)}</div>')
+                current_hidden_info.clear()
+            html_parts.append('<div class="click-hint">🔽 Cliquez pour voir les détails</div>' + end)
+        
         for line in response.split('\n'):
             line = line.strip()
             if not line:
                 continue
 
              # Section titles (emoji headers)
-            if line.startswith('🎲') or line.startswith('🤖'):
+            if line.startswith(_SECTION_PREFIXES):
                 # Close previous event if open
                 if in_event:
-                    if current_hidden_info:
-                        html_parts.append(f'<div class="more-info">{"".join(current_hidden_info)}</div>')
-                        current_hidden_info = []
-                    html_parts.append('<div class="click-hint">🔽 Cliquez pour voir les détails</div></li>')
+                    close_event()
                     in_event = False
                 html_parts.append(f'<h2 class="section-title">{line}</h2>')
                 continue
@@ -289,15 +357,12 @@ Description: {(event.get('description') or '')[:300]}"""
                 html_parts.append(f'<p class="suggestion-hint"><em>{line}</em></p>')
                 continue
 
-             # Event title with Like button
-            event_match = re.match(r'^(\d+)\.\s+\*\*(.+?)\*\*', line)
+             # Event title with Like button (regex seulement si la ligne commence par un chiffre)
+            event_match = _EVENT_TITLE_RE.match(line) if line[0].isdigit() else None
             if event_match:
                 # Close previous event
                 if in_event:
-                    if current_hidden_info:
-                        html_parts.append(f'<div class="more-info">{"".join(current_hidden_info)}</div>')
-                        current_hidden_info = []
-                    html_parts.append('<div class="click-hint">🔽 Cliquez pour voir les détails</div></li>')
+                    close_event()
                 
                 event_title = event_match.group(2).replace('"', "'")
                 like_btn = f'<button class="like-btn" data-event-title="{event_title}" data-category="{current_event_category}" onclick="toggleLike(event, this)">❤️</button>'
@@ -307,10 +372,10 @@ Description: {(event.get('description') or '')[:300]}"""
                 continue
              # Event details
             if in_event:
-                if line.startswith('📅') or line.startswith('📍') or line.startswith('💰'):
+                if line.startswith(_DETAIL_PREFIXES):
                     html_parts.append(f'<div class="event-detail">{line}</div>')
                 elif line.startswith('🔗'):
-                    url_match = re.search(r'(https?://[^\s]+)', line)
+                    url_match = _URL_RE.search(line)
                     if url_match:
                         url = url_match.group(1)
                         current_hidden_info.append(f'<div class="event-detail link"><a href="{url}" target="_blank">🔗 Voir le site officiel</a></div>')
@@ -321,9 +386,7 @@ Description: {(event.get('description') or '')[:300]}"""
                     current_hidden_info.append(f'<div class="event-description">📝 {desc}</div>')
         # Close last event
         if in_event:
-            if current_hidden_info:
-                html_parts.append(f'<div class="more-info">{"".join(current_hidden_info)}</div>')
-            html_parts.append('<div class="click-hint">🔽 Cliquez pour voir les détails</div></li></ul>')
+            close_event('</li></ul>')
         
         html_parts.append('</div>')
         return '\n'.join(html_parts)
@@ -344,6 +407,27 @@ Description: {(event.get('description') or '')[:300]}"""
         }
         return mapping.get(category.lower(), 'Music')
 
+    @staticmethod
+    def _cache_key(user_input: str) -> str:
+        """Normalise la requête: minuscules, sans ponctuation, espaces simples."""
+        return ' '.join(_NON_WORD_RE.sub(' ', user_input.lower()).split())
+
+    def _get_cached_response(self, key: str) -> Optional[str]:
+        entry = self._response_cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > _RESPONSE_CACHE_TTL:
+            del self._response_cache[key]
+            return None
+        return entry[1]
+
+    def _cache_response(self, key: str, html: str) -> None:
+        # Les dicts gardent l'ordre d'insertion: on retire le plus ancien quand le cache est plein
+        self._response_cache.pop(key, None)
+        if len(self._response_cache) >= _RESPONSE_CACHE_SIZE:
+            del self._response_cache[next(iter(self._response_cache))]
+        self._response_cache[key] = (time.monotonic(), html)
+
     def chat(self, user_input: str) -> str:
         """
         OPTIMIZED: Only 2 LLM calls max per request.
@@ -357,6 +441,12 @@ Description: {(event.get('description') or '')[:300]}"""
                 # Simple response - 1 small LLM call
                 response = self.llm.invoke(f"Réponds brièvement en français: {user_input}")
                 return f'<div class="response-content"><p>{response.content}</p></div>'
+
+            # STEP 0: Même demande récente -> réponse en cache
+            cache_key = self._cache_key(user_input)
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                return cached
             
             # STEP 1: ALWAY DO THIS STEP FIRST -   Detect category
             category = self._detect_category(user_input)
@@ -394,7 +484,9 @@ Description: {(event.get('description') or '')[:300]}"""
             formatted_text += ml_suggestion
             
             # STEP 7: Format to HTML (NO LLM!)
-            return self._format_to_html(formatted_text, category)
+            html = self._format_to_html(formatted_text, category)
+            self._cache_response(cache_key, html)
+            return html
             
         except Exception as e:
             print(f"[ERROR] {e}")
@@ -0,0 +1,34 @@
+import unittest
+
+from formatting import truncate_at_event
+
+
+class TruncateAtEventTest(unittest.TestCase):
+    def test_short_text_is_unchanged(self):
+        self.assertEqual(truncate_at_event("abc\n\ndef", 100), "abc\n\ndef")
+
+    def test_cuts_on_last_blank_line(self):
+        events = "\n\n".join(f"{i}. **Event {i}**\n📅 2026-01-0{i % 9 + 1}" for i in range(1, 40))
+        out = truncate_at_event(events, 500)
+        self.assertLessEqual(len(out), 500)
+        self.assertGreater(len(out), 250)
+        self.assertTrue(out.endswith(events[:len(out)].rsplit("\n\n", 1)[-1]))
+        self.assertEqual(events[len(out):len(out) + 2], "\n\n")
+
+    def test_single_newline_event_list_keeps_events(self):
+        # Intro + ligne vide, puis un événement par ligne: ne pas réduire à l'intro seule
+        intro = "Voici quelques idées pour toi !"
+        lines = "\n".join(f"[{i:012x}] Concert {i} | 2026-01-01 | Jazz au Flagey" for i in range(100))
+        text = intro + "\n\n" + lines
+        out = truncate_at_event(text, 2500)
+        self.assertLessEqual(len(out), 2500)
+        self.assertGreaterEqual(len(out), 1250)
+        self.assertTrue(out.startswith(intro))
+        self.assertEqual(text[len(out)], "\n")  # coupe sur une fin de ligne complète
+
+    def test_no_newline_falls_back_to_hard_cut(self):
+        self.assertEqual(truncate_at_event("x" * 50, 20), "x" * 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
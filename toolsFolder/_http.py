@@ -0,0 +1,29 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Session HTTP partagée par les outils EventBrite / Brussels / TicketMaster:
+# les connexions keep-alive (TCP + TLS) sont réutilisées d'un appel à l'autre
+SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    # Un seul nouvel essai, aussi sur 429 / 5xx; sans lever d'exception: les outils gardent leur propre
+    # gestion du statut. Retry-After ignoré pour ne pas attendre au-delà du budget ci-dessous.
+    max_retries=Retry(total=1, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+                      raise_on_status=False, respect_retry_after_header=False),
+)
+SESSION.mount("https://", _ADAPTER)
+SESSION.mount("http://", _ADAPTER)
+
+# (connexion, lecture) en secondes: une API qui ne répond pas ne bloque pas la requête de chat.
+# Pire cas avec le nouvel essai: 2 x (3 + 4) = 14 s, sous le délai de 15 s de newAgent (_EVENT_FETCH_TIMEOUT)
+REQUEST_TIMEOUT = (3, 4)
+
+# Décodage JSON des réponses API (plusieurs centaines de Ko): orjson s'il est installé, sinon json standard
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    import json
+    loads = json.loads
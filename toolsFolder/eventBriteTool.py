@@ -1,17 +1,20 @@
-import requests
 import json
 import csv
 import io
 import os 
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from .eventCache import event_cache  # Import global cache
+from ._http import SESSION, REQUEST_TIMEOUT, loads
 
 load_dotenv(override=True)
 EVENTBRITE_API_KEY = os.getenv("EVENTBRITE_PRIVATE_TOKEN")
+# Lieux interrogés en parallèle (même taille que le pool de connexions de la session partagée)
+VENUE_FETCH_WORKERS = 8
 embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
 
 
@@ -41,39 +44,48 @@ def fetch_events_to_cache(force_refresh: bool = False, cache_ttl: int = 36000) -
     
     all_events = []
     
-    for venue_id in IdList:
-        url = f'https://www.eventbriteapi.com/v3/venues/{venue_id}/events/'
-        headers = {'Authorization': f'Bearer {EVENTBRITE_API_KEY}'}
-        params = {'status': 'live', 'order_by': 'start_asc'}
-        
-        try:
-            response = requests.get(url, headers=headers, params=params)
-            if response.status_code == 200:
-                events = response.json().get('events', [])
-                for event in events:
-                    event_name = event['name']['text']
-                    event_desc = event.get('description', {}).get('text', '')[:500] if event.get('description') else ""
-                    
-                    full_event = {
-                        "name": event_name,
-                        "date": event['start']['local'],
-                        "url": event['url'],
-                        "description": event_desc.replace('\n', ' '),
-                        "venue": "EventBrite Venue",
-                        "address": "",
-                        "price": "Voir le site"
-                    }
-                    
-                    # Add to global cache
-                    event_cache.add_event(full_event, 'eventbrite')
-                    all_events.append(full_event)
-        except Exception as e:
-            print(f"[EventBrite] Error fetching venue {venue_id}: {e}")
+    # Les requêtes par lieu sont indépendantes: en parallèle, puis ajout au cache dans l'ordre de IdList
+    with ThreadPoolExecutor(max_workers=VENUE_FETCH_WORKERS) as pool:
+        venue_results = pool.map(_fetch_venue_events, IdList)
+        for venue_events in venue_results:
+            for full_event in venue_events:
+                # Add to global cache
+                event_cache.add_event(full_event, 'eventbrite')
+                all_events.append(full_event)
     
     print(f"[EventBrite] Cached {len(all_events)} events")
     return all_events
 
 
+def _fetch_venue_events(venue_id: str) -> list:
+    """Fetch the live events of one EventBrite venue (empty list on error)."""
+    url = f'https://www.eventbriteapi.com/v3/venues/{venue_id}/events/'
+    headers = {'Authorization': f'Bearer {EVENTBRITE_API_KEY}'}
+    params = {'status': 'live', 'order_by': 'start_asc'}
+    
+    venue_events = []
+    try:
+        response = SESSION.get(url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            events = loads(response.content).get('events', [])
+            for event in events:
+                event_name = event['name']['text']
+                event_desc = event.get('description', {}).get('text', '')[:500] if event.get('description') else ""
+                
+                venue_events.append({
+                    "name": event_name,
+                    "date": event['start']['local'],
+                    "url": event['url'],
+                    "description": event_desc.replace('\n', ' '),
+                    "venue": "EventBrite Venue",
+                    "address": "",
+                    "price": "Voir le site"
+                })
+    except Exception as e:
+        print(f"[EventBrite] Error fetching venue {venue_id}: {e}")
+    return venue_events
+
+
 def get_eventBrite_events_for_llm(category_filter: str = None, similarity_threshold: float = 0.15) -> str:
     """
     🌱 GREEN VERSION: Returns minimal data for LLM (ID + name + date + short desc).
@@ -1,7 +1,7 @@
-import requests
 import csv
 import io
 from .eventCache import event_cache  # Import global cache
+from ._http import SESSION, REQUEST_TIMEOUT, loads
 import os
 from dotenv import load_dotenv
 
@@ -51,9 +51,9 @@ def fetch_brussels_to_cache(category: str) -> list:
         params = {"page": 1}
     
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = SESSION.get(url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        all_events = response.json()["response"]["results"]["event"]
+        all_events = loads(response.content)["response"]["results"]["event"]
     except Exception as e:
         print(f"[Brussels] API Error: {e}")
         return []
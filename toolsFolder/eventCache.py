@@ -1,4 +1,6 @@
 import hashlib
+import random
+import threading
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 
@@ -10,6 +12,9 @@ class EventCache:
     
     def __init__(self):
         self.events: Dict[str, dict] = {}  # event_id -> full event data
+        self._ids: List[str] = []  # same keys as events, as a list for O(1) random picks
+        # Tools add events from pool threads: events and _ids are updated together under this lock
+        self._lock = threading.Lock()
         self.last_refresh: Dict[str, datetime] = {}  # source -> last refresh time
         self.ttl_seconds = 36000  # 10 hours
     
@@ -30,18 +35,34 @@ class EventCache:
             str: Event ID
         """
         event_id = self._generate_id(event.get('name', ''), source)
-        self.events[event_id] = {
+        cached = {
             **event,
             '_id': event_id,
             '_source': source,
             '_cached_at': datetime.now().isoformat()
         }
+        with self._lock:
+            if event_id not in self.events:
+                self._ids.append(event_id)
+            self.events[event_id] = cached
         return event_id
     
     def get_event(self, event_id: str) -> Optional[dict]:
         """Get full event data by ID."""
         return self.events.get(event_id)
     
+    def get_events_batch(self, event_ids: List[str]) -> List[Optional[dict]]:
+        """Get full event data for several IDs at once (None for unknown IDs), in input order."""
+        get = self.events.get
+        return [get(event_id) for event_id in event_ids]
+    
+    def random_event(self) -> Optional[dict]:
+        """Get one cached event chosen uniformly at random (None if the cache is empty)."""
+        with self._lock:
+            if not self._ids:
+                return None
+            return self.events[random.choice(self._ids)]
+    
     def find_event_by_name(self, name: str, fuzzy: bool = True) -> Optional[dict]:
         """
         Find event by name (exact or fuzzy match).
@@ -105,10 +126,12 @@ class EventCache:
     
     def clear(self, source: str = None):
         """Clear cache (all or by source)."""
-        if source:
-            self.events = {k: v for k, v in self.events.items() if v.get('_source') != source}
-        else:
-            self.events = {}
+        with self._lock:
+            if source:
+                self.events = {k: v for k, v in self.events.items() if v.get('_source') != source}
+            else:
+                self.events = {}
+            self._ids = list(self.events)
     
     def stats(self) -> dict:
         """Get cache statistics."""
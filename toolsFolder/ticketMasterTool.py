@@ -1,9 +1,9 @@
-import requests
 import csv
 import os
 import io
 from dotenv import load_dotenv
 from .eventCache import event_cache  # Import global cache
+from ._http import SESSION, REQUEST_TIMEOUT, loads
 
 load_dotenv(override=True)
 
@@ -40,9 +40,9 @@ def fetch_ticketmaster_to_cache(classificationName: str) -> list:
         }
 
     try:
-        response = requests.get(url, params=params)
+        response = SESSION.get(url, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
+        data = loads(response.content)
     except Exception as e:
         print(f"[TicketMaster] API Error: {e}")
         return []